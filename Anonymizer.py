@@ -0,0 +1,447 @@
+# This Python file uses the following encoding: utf-8
+import os
+import sys
+import json
+import time
+import struct
+import hashlib
+import secrets
+import argparse
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+import pydicom
+from pydicom.datadict import tag_for_keyword, dictionary_VR
+from pydicom.filebase import DicomFileLike
+from pydicom.filereader import read_dataset
+from pydicom.filewriter import write_dataset
+from pydicom.uid import DeflatedExplicitVRLittleEndian, generate_uid
+
+# Acción sobre cada atributo con datos del paciente (PHI): 'remove' lo
+# elimina, 'empty' lo deja vacío, 'hash' lo sustituye por un seudónimo
+# estable, 'uid' genera un UID nuevo (el mismo para el mismo UID original)
+# y ['replace', valor] lo sustituye. Las acciones se aplican también dentro
+# de las secuencias, a cualquier nivel.
+# Es un perfil PARCIAL: cubre los atributos de identificación más comunes
+# de la tabla E.1-1 de PS3.15 (perfil básico de confidencialidad), pero no
+# la tabla completa. Para cumplir el perfil básico hay que pasar la tabla
+# completa con --profile
+PARTIAL_PROFILE = {
+    # Paciente
+    'PatientName': ['replace', 'ANONIMO'],
+    'PatientID': 'hash',
+    'IssuerOfPatientID': 'remove',
+    'PatientBirthDate': 'empty',
+    'PatientBirthTime': 'remove',
+    'PatientBirthName': 'remove',
+    'PatientSex': 'empty',
+    'PatientAge': 'remove',
+    'PatientSize': 'remove',
+    'PatientWeight': 'remove',
+    'PatientAddress': 'remove',
+    'PatientTelephoneNumbers': 'remove',
+    'PatientMotherBirthName': 'remove',
+    'PatientReligiousPreference': 'remove',
+    'PatientInsurancePlanCodeSequence': 'remove',
+    'PatientState': 'remove',
+    'PatientComments': 'remove',
+    'OtherPatientIDs': 'remove',
+    'OtherPatientIDsSequence': 'remove',
+    'OtherPatientNames': 'remove',
+    'MedicalRecordLocator': 'remove',
+    'EthnicGroup': 'remove',
+    'Occupation': 'remove',
+    'MilitaryRank': 'remove',
+    'BranchOfService': 'remove',
+    'CountryOfResidence': 'remove',
+    'RegionOfResidence': 'remove',
+    'ResponsiblePerson': 'remove',
+    'ResponsibleOrganization': 'remove',
+    'AdditionalPatientHistory': 'remove',
+    'MedicalAlerts': 'remove',
+    'Allergies': 'remove',
+    'SmokingStatus': 'remove',
+    'PregnancyStatus': 'remove',
+    'LastMenstrualDate': 'remove',
+    'SpecialNeeds': 'remove',
+    'ReferencedPatientSequence': 'remove',
+    # Visita y solicitud
+    'AdmissionID': 'remove',
+    'AdmittingDiagnosesDescription': 'remove',
+    'CurrentPatientLocation': 'remove',
+    'PatientInstitutionResidence': 'remove',
+    'VisitComments': 'remove',
+    'RequestAttributesSequence': 'remove',
+    'RequestedProcedureID': 'remove',
+    'RequestedProcedureDescription': 'remove',
+    'ReasonForTheRequestedProcedure': 'remove',
+    'PlacerOrderNumberImagingServiceRequest': 'empty',
+    'FillerOrderNumberImagingServiceRequest': 'empty',
+    'RequestingPhysician': 'remove',
+    'RequestingService': 'remove',
+    'ScheduledProcedureStepDescription': 'remove',
+    'PerformedProcedureStepID': 'remove',
+    'PerformedProcedureStepDescription': 'remove',
+    'PerformedProcedureStepStartDate': 'remove',
+    'PerformedProcedureStepStartTime': 'remove',
+    # Estudio, serie e instancia
+    'AccessionNumber': 'empty',
+    'IssuerOfAccessionNumberSequence': 'remove',
+    'StudyID': 'empty',
+    'StudyDate': 'empty',
+    'SeriesDate': 'remove',
+    'AcquisitionDate': 'remove',
+    'ContentDate': 'remove',
+    'InstanceCreationDate': 'remove',
+    'StudyTime': 'empty',
+    'SeriesTime': 'remove',
+    'AcquisitionTime': 'remove',
+    'ContentTime': 'remove',
+    'InstanceCreationTime': 'remove',
+    'AcquisitionDateTime': 'remove',
+    'TimezoneOffsetFromUTC': 'remove',
+    'StudyDescription': 'remove',
+    'SeriesDescription': 'remove',
+    'ProtocolName': 'remove',
+    'ImageComments': 'remove',
+    'FrameComments': 'remove',
+    'StudyComments': 'remove',
+    'AcquisitionComments': 'remove',
+    'DerivationDescription': 'remove',
+    'TextComments': 'remove',
+    # Personal e institución
+    'InstitutionName': 'remove',
+    'InstitutionAddress': 'remove',
+    'InstitutionCodeSequence': 'remove',
+    'InstitutionalDepartmentName': 'remove',
+    'ReferringPhysicianName': 'empty',
+    'ReferringPhysicianAddress': 'remove',
+    'ReferringPhysicianTelephoneNumbers': 'remove',
+    'ReferringPhysicianIdentificationSequence': 'remove',
+    'ConsultingPhysicianName': 'remove',
+    'PerformingPhysicianName': 'remove',
+    'PerformingPhysicianIdentificationSequence': 'remove',
+    'NameOfPhysiciansReadingStudy': 'remove',
+    'PhysiciansReadingStudyIdentificationSequence': 'remove',
+    'PhysiciansOfRecord': 'remove',
+    'PhysiciansOfRecordIdentificationSequence': 'remove',
+    'OperatorsName': 'remove',
+    'OperatorIdentificationSequence': 'remove',
+    'ScheduledPerformingPhysicianName': 'remove',
+    'ContentCreatorName': 'remove',
+    'VerifyingObserverName': 'remove',
+    'PersonName': 'remove',
+    # Equipo
+    'StationName': 'remove',
+    'ScheduledStationName': 'remove',
+    'PerformedStationName': 'remove',
+    'PerformedLocation': 'remove',
+    'DeviceSerialNumber': 'remove',
+    'DetectorID': 'remove',
+    'GantryID': 'remove',
+    'PlateID': 'remove',
+    # Historial de modificaciones y datos sin interpretar
+    'ModifiedAttributesSequence': 'remove',
+    'OriginalAttributesSequence': 'remove',
+    'DigitalSignaturesSequence': 'remove',
+    'DataSetTrailingPadding': 'remove',
+    # UID
+    'StudyInstanceUID': 'uid',
+    'SeriesInstanceUID': 'uid',
+    'SOPInstanceUID': 'uid',
+    'MediaStorageSOPInstanceUID': 'uid',
+    'ReferencedSOPInstanceUID': 'uid',
+    'ReferencedSOPInstanceUIDInFile': 'uid',
+    'FrameOfReferenceUID': 'uid',
+    'ReferencedFrameOfReferenceUID': 'uid',
+    'RelatedFrameOfReferenceUID': 'uid',
+    'SynchronizationFrameOfReferenceUID': 'uid',
+    'InstanceCreatorUID': 'uid',
+    'IrradiationEventUID': 'uid',
+    'ConcatenationUID': 'uid',
+    'DimensionOrganizationUID': 'uid',
+    'StorageMediaFileSetUID': 'uid',
+    'TransactionUID': 'uid',
+    'FiducialUID': 'uid',
+    'DeviceUID': 'uid',
+    'TargetUID': 'uid',
+    'UID': 'uid',
+}
+
+ACTIONS = ('remove', 'empty', 'hash', 'uid')
+
+# Tamaño de los bloques con que se copian los píxeles sin decodificarlos
+COPY_CHUNK = 1024 * 1024
+# VR explícitas con longitud de 4 bytes (las demás usan 2)
+LONG_VRS = {b'OB', b'OD', b'OF', b'OL', b'OV', b'OW', b'SQ', b'SV', b'UC',
+            b'UN', b'UR', b'UT', b'UV'}
+# Longitud indefinida y delimitador de los datos encapsulados
+UNDEFINED_LENGTH = 0xFFFFFFFF
+SEQUENCE_DELIMITER = (0xFFFE, 0xE0DD)
+
+
+class Anonymizer:
+    def __init__(self, profile: dict | None = None, salt: str | None = None,
+                 remove_private: bool = True) -> None:
+        # Las acciones se indexan por etiqueta para aplicarlas a cualquier
+        # nivel de secuencias anidadas
+        self.profile = {}
+        for keyword, action in (profile or PARTIAL_PROFILE).items():
+            tag = tag_for_keyword(keyword)
+            if tag is None:
+                raise ValueError(f'Atributo desconocido en el perfil: {keyword}')
+            if action not in ACTIONS and not (
+                    isinstance(action, list) and len(action) == 2
+                    and action[0] == 'replace'):
+                raise ValueError(f'Acción desconocida en el perfil: {action}')
+            self.profile[tag] = action
+        # Con la misma sal, los UID y seudónimos coinciden entre ejecuciones
+        self.salt = secrets.token_hex(16) if salt is None else salt
+        self.remove_private = remove_private
+
+
+    def file(self, src: str, dst: str) -> None:
+        # Se lee sólo la cabecera: el elemento de píxeles se copia por
+        # bloques desde su posición en el archivo original, y los elementos
+        # que haya detrás (ej. grupos privados o relleno) se leen y
+        # anonimizan como la cabecera
+        tmp = dst + '.tmp'
+        with open(src, 'rb') as f:
+            ds = pydicom.dcmread(f, stop_before_pixels=True)
+            pixels = f.tell()
+            syntax = ds.file_meta.get('TransferSyntaxUID')
+            deflated = syntax == DeflatedExplicitVRLittleEndian
+            if deflated:
+                # La posición en un archivo comprimido con deflate no sirve
+                # para copiar: se reescribe completo
+                ds = pydicom.dcmread(src)
+            self.dataset(ds)
+            # Sin sintaxis en la cabecera se asume la implícita por defecto
+            implicit = syntax.is_implicit_VR if syntax else True
+            little = syntax.is_little_endian if syntax else True
+            try:
+                with open(tmp, 'wb') as out:
+                    ds.save_as(out)
+                    if not deflated:
+                        f.seek(pixels)
+                        end = self._element_end(f, implicit, little)
+                        f.seek(pixels)
+                        self._copy(f, out, end - pixels)
+                        self._trailing(f, out, implicit, little)
+            except BaseException:
+                os.remove(tmp)
+                raise
+        os.replace(tmp, dst)
+
+
+    @staticmethod
+    def _element_end(f, implicit: bool, little: bool) -> int:
+        # Posición final del elemento que empieza en la posición actual (el
+        # de píxeles), sin leer su valor. Los datos encapsulados se
+        # recorren fragmento a fragmento hasta su delimitador
+        endian = '<' if little else '>'
+        header = f.read(8)
+        if len(header) < 8:
+            return f.tell()
+        if implicit:
+            length, = struct.unpack(endian + 'L', header[4:])
+        elif header[4:6] in LONG_VRS:
+            length, = struct.unpack(endian + 'L', f.read(4))
+        else:
+            length, = struct.unpack(endian + 'H', header[6:])
+        if length != UNDEFINED_LENGTH:
+            return f.tell() + length
+        while True:
+            item = f.read(8)
+            if len(item) < 8:
+                return f.tell()
+            group, element, length = struct.unpack(endian + 'HHL', item)
+            if (group, element) == SEQUENCE_DELIMITER:
+                return f.tell()
+            f.seek(length, os.SEEK_CUR)
+
+
+    @staticmethod
+    def _copy(f, out, size: int) -> None:
+        while size > 0:
+            chunk = f.read(min(size, COPY_CHUNK))
+            if not chunk:
+                break
+            out.write(chunk)
+            size -= len(chunk)
+
+
+    def _trailing(self, f, out, implicit: bool, little: bool) -> None:
+        # Elementos detrás de los píxeles: se leen, se anonimizan y se
+        # escriben sólo los que quedan
+        trailing = read_dataset(f, implicit, little)
+        self._walk(trailing)
+        if not len(trailing):
+            return
+        fp = DicomFileLike(out)
+        fp.is_implicit_VR = implicit
+        fp.is_little_endian = little
+        write_dataset(fp, trailing)
+
+
+    def dataset(self, ds: pydicom.Dataset) -> None:
+        self._walk(ds)
+        file_meta = getattr(ds, 'file_meta', None)
+        if file_meta is not None:
+            self._walk(file_meta)
+        ds.PatientIdentityRemoved = 'YES'
+        ds.DeidentificationMethod = 'QDicom-viewer'
+
+
+    def _walk(self, ds: pydicom.Dataset) -> None:
+        # Recorrido de la cabecera y sus secuencias. Sólo se convierten los
+        # elementos del perfil y las secuencias: el resto se escribe tal
+        # como se leyó, sin interpretar su valor
+        for tag in list(ds.keys()):
+            if self.remove_private and tag.is_private:
+                del ds[tag]
+                continue
+            if tag in self.profile:
+                self._apply(ds, ds[tag])
+            if tag in ds and self._is_sequence(ds.get_item(tag)):
+                for item in ds[tag].value:
+                    self._walk(item)
+
+
+    @staticmethod
+    def _is_sequence(elem) -> bool:
+        if elem.VR is not None:
+            return elem.VR == 'SQ'
+        try:
+            return dictionary_VR(elem.tag) == 'SQ'
+        except KeyError:
+            return False
+
+
+    def _apply(self, ds: pydicom.Dataset, elem: pydicom.DataElement) -> None:
+        action = self.profile[elem.tag]
+        match action:
+            case 'remove':
+                del ds[elem.tag]
+            case 'empty':
+                elem.value = [] if elem.VR == 'SQ' else ''
+            case 'hash':
+                elem.value = self._hash(str(elem.value))
+            case 'uid':
+                if elem.VM > 1:
+                    elem.value = [self._uid(str(v)) for v in elem.value]
+                elif elem.value:
+                    elem.value = self._uid(str(elem.value))
+            case ['replace', value]:
+                elem.value = value
+
+
+    def _hash(self, value: str) -> str:
+        digest = hashlib.sha256(f'{self.salt}:{value}'.encode()).hexdigest()
+        return digest[:16].upper()
+
+
+    def _uid(self, uid: str) -> str:
+        return generate_uid(entropy_srcs=[self.salt, uid])
+
+
+    def tree(self, root: str, output: str | None = None,
+             workers: int | None = None,
+             progress: Callable[[int, int, float], None] | None = None) -> dict:
+        # Anonimiza todos los archivos DICOM bajo root. Sin output se
+        # sobrescriben los originales; si no, se replica el árbol en output
+        root = os.path.abspath(root)
+        fnames = [
+            os.path.join(dirpath, name)
+            for dirpath, _, filenames in os.walk(root) for name in filenames
+        ]
+        if output is None:
+            pairs = [(f, f) for f in fnames]
+        else:
+            pairs = [
+                (f, os.path.join(output, os.path.relpath(f, root)))
+                for f in fnames
+            ]
+        return self.files(pairs, workers, progress)
+
+
+    def files(self, pairs: list[tuple[str, str]], workers: int | None = None,
+              progress: Callable[[int, int, float], None] | None = None) -> dict:
+        # Lote de pares (origen, destino) procesados en paralelo; cada
+        # hilo sólo mantiene en memoria una cabecera y un bloque de píxeles
+        workers = workers or 4 * (os.cpu_count() or 1)
+        start = time.perf_counter()
+        done = skipped = 0
+
+        def process(pair: tuple[str, str]) -> bool:
+            # Los archivos que no son DICOM o no se pueden leer se omiten
+            src, dst = pair
+            try:
+                os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+                self.file(src, dst)
+            except (pydicom.errors.InvalidDicomError, OSError, ValueError):
+                return False
+            return True
+
+        with ThreadPoolExecutor(workers) as executor:
+            for ok in executor.map(process, pairs):
+                done += 1
+                skipped += not ok
+                if progress is not None:
+                    progress(done, len(pairs), time.perf_counter() - start)
+
+        seconds = time.perf_counter() - start
+        return {
+            'files': done - skipped,
+            'skipped': skipped,
+            'seconds': seconds,
+            'files_per_second': (done - skipped) / seconds if seconds else 0.0,
+        }
+
+
+def load_profile(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Anonimización por lotes de árboles de archivos DICOM'
+    )
+    parser.add_argument('input', help='directorio con los archivos originales')
+    parser.add_argument('output', nargs='?', default=None,
+                        help='directorio de salida (se replica el árbol)')
+    parser.add_argument('--in-place', action='store_true',
+                        help='sobrescribir los archivos originales')
+    parser.add_argument('--profile', default=None,
+                        help='JSON con la acción de cada atributo')
+    parser.add_argument('--salt', default=None,
+                        help='sal de los UID y seudónimos, para que coincidan '
+                             'entre ejecuciones')
+    parser.add_argument('--keep-private', action='store_true',
+                        help='conservar las etiquetas privadas')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.output is None and not args.in_place:
+        parser.error('se requiere un directorio de salida o --in-place')
+
+    profile = load_profile(args.profile) if args.profile else None
+    anonymizer = Anonymizer(profile, args.salt, not args.keep_private)
+
+    def progress(done: int, total: int, seconds: float) -> None:
+        if done % 100 == 0 or done == total:
+            print(f'\r{done}/{total} archivos, {done / seconds:.1f} archivos/s',
+                  end='', file=sys.stderr)
+
+    report = anonymizer.tree(
+        args.input, None if args.in_place else args.output,
+        args.workers, progress
+    )
+    print(file=sys.stderr)
+    print(f"{report['files']} archivos anonimizados, {report['skipped']} omitidos "
+          f"en {report['seconds']:.2f} s ({report['files_per_second']:.1f} archivos/s)")
+
+
+if __name__ == '__main__':
+    main()
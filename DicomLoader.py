@@ -1,7 +1,27 @@
 # This Python file uses the following encoding: utf-8
+import os
+import copy
+import glob
+import threading
+from typing import Callable
+from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
+
 import pydicom
+from pydicom.multival import MultiValue
 import numpy as np
-import glob
+
+from VolumeCache import VolumeCache
+from VolumeStats import VolumeStats
+from SliceCache import SliceCache, DEFAULT_SLICE_CACHE, DEFAULT_READ_AHEAD
+from PixelCodecs import FrameDecoder, frame_count
+from Anonymizer import Anonymizer
+from Instrumentation import instrument
+from VolumeKernels import VolumeKernels, DEFAULT_DENOISE_SIGMA, rescale
+
+# Tamaño a partir del cual pydicom no lee el valor de un elemento hasta que
+# se accede a él (PixelData)
+DEFER_SIZE = '64 KB'
 
 class InvalidDICOM(Exception):
     def __init__(self, filename: str) -> None:
@@ -18,69 +38,478 @@ class DICOMNotFound(Exception):
         return 'No se encontraron archivos DICOM válidos'
 
 
+class LoadCancelled(Exception):
+    def __str__(self):
+        return 'Carga cancelada'
+
+
 class DicomLoader:
-    def __init__(self, path: str) -> None:
-        # Carga de archivos
-        files = []
-        try:
-            for fname in glob.glob(path, recursive=False):
-                files.append(pydicom.dcmread(fname))
-        except pydicom.errors.InvalidDicomError:
-            raise InvalidDICOM(fname)
+    def __init__(self, path: str | list[str], workers: int | None = None,
+                 dtype: np.dtype | None = None,
+                 memmap: str | None = None,
+                 cache: VolumeCache | None = None,
+                 deferred: bool = False,
+                 lazy: bool = False,
+                 slice_cache: int = DEFAULT_SLICE_CACHE,
+                 read_ahead: int = DEFAULT_READ_AHEAD,
+                 decoder: FrameDecoder | None = None) -> None:
+        # Número de hilos para la lectura de archivos, por defecto uno
+        # por núcleo disponible
+        self.workers = workers or os.cpu_count() or 1
+        self.lazy = lazy
+        # Decodificador de píxeles según la sintaxis de transferencia
+        self.decoder = decoder or FrameDecoder()
+        # Operaciones sobre el volumen completo, por bloques de cortes con
+        # los mismos hilos
+        self.kernels = VolumeKernels(self.workers)
+        self._load_lock = threading.Lock()
+        self._assembly = None
+        self._slice_cache = None
+
+        # La serie se indica con un patrón glob o con la lista de archivos
+        # (ej. la de una serie encontrada por DicomScanner)
+        if isinstance(path, str):
+            fnames = [f for f in glob.glob(path, recursive=False) if os.path.isfile(f)]
+        else:
+            fnames = list(path)
+
+        # Si la serie ya está en la caché se abre el volumen mapeado en
+        # memoria, sin leer ningún archivo DICOM
+        if cache is not None:
+            key = cache.key(fnames)
+            entry = cache.load(key) if key is not None else None
+            if entry is not None and (dtype is None or entry[0].dtype == dtype):
+                self._from_cache(*entry)
+                return
+        self._cache = cache
+
+        # Carga de cabeceras; los datos de píxeles se difieren hasta que se
+        # accede a ellos, así no se vuelve a analizar el archivo completo
+        with ThreadPoolExecutor(self.workers) as executor:
+            files = list(executor.map(self._read_header, fnames))
 
         if not len(files):
             raise DICOMNotFound
 
-        # Se saltan los archivos sin SliceLocation (ej. scout views)
+        # Se saltan los archivos sin SliceLocation (ej. scout views), salvo
+        # los objetos multiframe que guardan la geometría por frame
         self.slices = []
         skipcount = 0
         for f in files:
-            if hasattr(f, 'SliceLocation'):
+            if hasattr(f, 'SliceLocation') or self._multiframe_geometry(f):
                 self.slices.append(f)
             else:
                 skipcount += 1
 
-        # Orden correcto de los cortes
+        if not len(self.slices):
+            raise DICOMNotFound
+
+        # Orden correcto de los cortes. Cada objeto multiframe aporta un
+        # corte por frame, en el orden en que se guardan
         self.slices = sorted(self.slices, key=lambda x: x.InstanceNumber)
+        self.files = [s.filename for s in self.slices]
+        self.frames = [
+            (i, frame) for i, s in enumerate(self.slices)
+            for frame in range(frame_count(s))
+        ]
 
         # Relación de aspecto, asumiendo que todos los cortes tienen
         # el mismo spacing y thickness
-        self.ps = self.slices[0].PixelSpacing
-        self.st = self.slices[0].SliceThickness
+        first = self.slices[0]
+        group = 'PixelMeasuresSequence'
+        self._set_spacing(
+            [float(v) for v in self._frame_value(first, 0, group, 'PixelSpacing')],
+            float(self._frame_value(first, 0, group, 'SliceThickness'))
+        )
+
+        # Ventanas sugeridas por la cabecera como (centro, ancho)
+        self.windows = self._header_windows(self.slices[0])
+
+        # Regresión lineal de cada corte. Si todos comparten pendiente y
+        # ordenada se guardan los valores originales (en el tipo pedido, si
+        # es un entero que los contiene) y la regresión se aplica al pedir
+        # un plano; si no, se guardan ya convertidos en coma flotante
+        rescales = {self._frame_rescale(i) for i in range(len(self.frames))}
+        kind = 'i' if first.PixelRepresentation else 'u'
+        stored = np.dtype(f'{kind}{first.BitsAllocated // 8}')
+        dtype = None if dtype is None else np.dtype(dtype)
+        if len(rescales) == 1 and (
+                dtype is None or dtype.kind in 'iu' and np.can_cast(stored, dtype)):
+            self.slope, self.intercept = next(iter(rescales))
+            self.dtype = stored if dtype is None else dtype
+        elif dtype is None or dtype.kind == 'f':
+            self.slope, self.intercept = 1.0, 0.0
+            self.dtype = np.dtype(np.float32) if dtype is None else dtype
+        else:
+            raise ValueError(
+                f'El tipo {dtype} no puede guardar los valores de la serie '
+                f'({stored}); use un tipo de coma flotante'
+            )
+
+        # Histograma del volumen, que se completa mientras se decodifican
+        # los cortes. El rango posible de valores sale de la cabecera
+        limits = [m * v + b for m, b in rescales
+                  for v in (np.iinfo(stored).min, np.iinfo(stored).max)]
+        self.value_range = (min(limits), max(limits))
+        self.stats = VolumeStats(
+            self.dtype, self.slope, self.intercept, self.value_range
+        )
+
+        # Creación del volumen a partir de las dimensiones de la cabecera,
+        # ordenado por cortes (z, y, x) para que cada uno sea contiguo.
+        # Opcionalmente se respalda en disco para volúmenes mayores que la RAM.
+        # np.zeros sólo reserva memoria virtual: las páginas se ocupan al
+        # escribir cada corte, así que un volumen perezoso sin ensamblar
+        # apenas consume RAM
+        y, x = first.Rows, first.Columns
+        z = len(self.frames)
+        self.shape = (y, x, z)
+        if memmap is None:
+            self.volume = np.zeros((z, y, x), self.dtype)
+        else:
+            self.volume = np.memmap(memmap, self.dtype, 'w+', shape=(z, y, x))
+
+        # Número de cortes consecutivos, desde el primero, ya decodificados
+        self.ready = 0
+        self._slice_min = np.empty(z)
+        self._slice_max = np.empty(z)
+        self.min, self.max = self.value_range
+        self._low, self._high = np.inf, -np.inf
+        self._limits_lock = threading.Lock()
+        self._fnames = fnames
+        self._headers = files
+
+        # En modo perezoso los cortes axiales se decodifican al pedirlos,
+        # con una caché acotada, y el volumen completo sólo se ensambla
+        # cuando hace falta un plano sagital o coronal
+        self.auto_assemble = lazy
+        if lazy:
+            self._slice_cache = SliceCache(
+                self._decode, z, slice_cache, read_ahead, self.workers
+            )
+
+        # Si la carga se difiere, los píxeles se leen al llamar a load()
+        if not deferred and not lazy:
+            self.load()
+
+
+    def load(self, progress: Callable[[int, int], None] | None = None,
+             cancel: threading.Event | None = None) -> None:
+        # Se rellena el volumen con los píxeles de cada corte, ya ordenados,
+        # decodificando los archivos en paralelo. Los resultados llegan en
+        # orden, así que los cortes [0, ready) ya pueden mostrarse
+        # Sólo una carga a la vez; si ya se ensambló en segundo plano, se
+        # informa directamente del volumen completo
+        with self._load_lock, instrument.timer('assemble'):
+            self._load(progress, cancel)
+
+
+    def _load(self, progress: Callable[[int, int], None] | None,
+              cancel: threading.Event | None) -> None:
+        z = len(self.frames)
+        if self.ready == z:
+            if progress is not None:
+                progress(z, z)
+            return
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            for index in executor.map(self._read_pixels, range(self.ready, z)):
+                if cancel is not None and cancel.is_set():
+                    # Tras cancelar, los planos no vuelven a iniciar la
+                    # carga por su cuenta
+                    self.auto_assemble = False
+                    executor.shutdown(cancel_futures=True)
+                    raise LoadCancelled
+                self.ready = index + 1
+                if progress is not None:
+                    progress(self.ready, z)
+
+        # Con el volumen completo ya no hacen falta los cortes sueltos
+        self.decoder.release()
+        if self._slice_cache is not None:
+            self._slice_cache.close()
+            self._slice_cache = None
+
+        # Se guarda el volumen para las próximas aperturas de la serie
+        if self._cache is not None:
+            key = self._cache.key(self._fnames, self._headers)
+            self._cache.store(key, self._fnames, self.volume, self._metadata())
+        del self._headers
+
+
+    def assemble(self) -> None:
+        # Carga completa en segundo plano de un volumen perezoso. No hace
+        # nada si ya está completo o si se está cargando
+        if self.ready == len(self.frames) or self._load_lock.locked():
+            return
+        if self._assembly is None or not self._assembly.is_alive():
+            self._assembly = threading.Thread(target=self.load, daemon=True)
+            self._assembly.start()
+
+
+    @classmethod
+    def _header_windows(cls, ds: pydicom.Dataset) -> list[tuple[float, float]]:
+        group = 'FrameVOILUTSequence'
+        centers = cls._frame_value(ds, 0, group, 'WindowCenter')
+        widths = cls._frame_value(ds, 0, group, 'WindowWidth')
+        if centers is None or widths is None:
+            return []
+        if not isinstance(centers, MultiValue):
+            centers, widths = [centers], [widths]
+        return [(float(c), float(w)) for c, w in zip(centers, widths)]
+
+
+    @classmethod
+    def _multiframe_geometry(cls, ds: pydicom.Dataset) -> bool:
+        # Un objeto multiframe sólo forma un volumen si sus grupos
+        # funcionales (o el propio dataset) indican la separación de los
+        # píxeles, el grosor y la posición de los frames; los que no (ej.
+        # capturas secundarias) se saltan como las scout views
+        return frame_count(ds) > 1 and all(
+            cls._frame_value(ds, 0, group, keyword) is not None
+            for group, keyword in (
+                ('PixelMeasuresSequence', 'PixelSpacing'),
+                ('PixelMeasuresSequence', 'SliceThickness'),
+                ('PlanePositionSequence', 'ImagePositionPatient'),
+            )
+        )
+
+
+    def _set_spacing(self, ps: list[float], st: float) -> None:
+        self.ps = ps
+        self.st = st
         self.ax_aspect = self.ps[1]/self.ps[0]
         self.sag_aspect = self.ps[1]/self.st
         self.cor_aspect = self.st/self.ps[0]
 
-        # Creación de la matriz 3D
-        y, x = self.slices[0].pixel_array.shape
-        z = len(self.slices)
-        self.shape = (y, x, z)
-        self.img3d = np.zeros(self.shape)
 
-        # Se rellena la matriz 3D con los píxeles de cada corte
-        # y se aplica una regresión lineal para mejorar la calidad de la
-        # imagen
-        for i, s in enumerate(self.slices):
-            img2d = s.pixel_array
-            m = s.RescaleSlope
-            b = s.RescaleIntercept
-            img2d = m * img2d + b
-            self.img3d[:, :, i] = img2d
+    def _metadata(self) -> dict:
+        # Datos necesarios para reconstruir el cargador desde la caché
+        return {
+            'files': self.files,
+            'frames': self.frames,
+            'ps': self.ps,
+            'st': self.st,
+            'slope': self.slope,
+            'intercept': self.intercept,
+            'windows': self.windows,
+            'shape': self.shape,
+            'slice_min': self._slice_min.tolist(),
+            'slice_max': self._slice_max.tolist(),
+            'min': self.min,
+            'max': self.max,
+            'value_range': self.value_range,
+            'histogram': self.stats.to_sparse(),
+        }
 
-        # Valor mínimo y máximo del espectro
-        self.min = self.img3d.min()
-        self.max = self.img3d.max()
 
+    def _from_cache(self, volume: np.ndarray, meta: dict) -> None:
+        self.volume = volume
+        self.dtype = volume.dtype
+        self.files = meta['files']
+        # Las entradas anteriores a los objetos multiframe tienen un corte
+        # por archivo
+        frames = meta.get('frames', [(i, 0) for i in range(len(self.files))])
+        self.frames = [tuple(f) for f in frames]
+        self._set_spacing(meta['ps'], meta['st'])
+        self.slope = meta['slope']
+        self.intercept = meta['intercept']
+        self.windows = [tuple(w) for w in meta.get('windows', [])]
+        self.shape = tuple(meta['shape'])
+        self._slice_min = np.array(meta['slice_min'])
+        self._slice_max = np.array(meta['slice_max'])
+        self.min = meta['min']
+        self.max = meta['max']
+        self.value_range = tuple(meta.get('value_range', (self.min, self.max)))
+        self.stats = VolumeStats(
+            self.dtype, self.slope, self.intercept, self.value_range
+        )
+        self.stats.load_sparse(meta.get('histogram', []))
+        self.ready = len(self.frames)
+
+
+    @cached_property
+    def slices(self) -> list[pydicom.FileDataset]:
+        # Si el volumen viene de la caché, las cabeceras se leen sólo
+        # cuando se piden
+        with ThreadPoolExecutor(self.workers) as executor:
+            return list(executor.map(self._read_header, self.files))
+
+
+    @staticmethod
+    def _read_header(fname: str) -> pydicom.FileDataset:
+        try:
+            with instrument.timer('read.header'):
+                return pydicom.dcmread(fname, defer_size=DEFER_SIZE)
+        except pydicom.errors.InvalidDicomError:
+            raise InvalidDICOM(fname)
+
+
+    def _decode(self, index: int) -> np.ndarray:
+        position, frame = self.frames[index]
+        img2d = self._pixel_array(self.slices[position], frame)
+
+        # Se aplica la regresión lineal sólo si el volumen no guarda
+        # los valores originales (los enteros siempre los guardan)
+        if self.dtype.kind == 'f':
+            m, b = self._frame_rescale(index)
+            img2d = rescale(img2d, m, b, self.dtype)
+        img2d = img2d.astype(self.dtype, copy=False)
+        self._update_limits(index, img2d)
+        return img2d
+
+
+    def _read_pixels(self, index: int) -> int:
+        # Los cortes que ya se decodificaron al pedirlos se copian desde
+        # la caché en lugar de volver a leerlos
+        img2d = None
+        if self._slice_cache is not None:
+            img2d = self._slice_cache.pop(index)
+        if img2d is None:
+            img2d = self._decode(index)
+        with instrument.timer('assemble.slice'):
+            self.volume[index] = img2d
+            self.stats.add(img2d)
+        return index
+
+
+    def _update_limits(self, index: int, img2d: np.ndarray) -> None:
+        # Valor mínimo y máximo del espectro de los cortes leídos, a partir
+        # de los de cada corte
+        low, high = img2d.min(), img2d.max()
+        with self._limits_lock:
+            self._slice_min[index] = low
+            self._slice_max[index] = high
+            self._low = min(self._low, low)
+            self._high = max(self._high, high)
+            self.min, self.max = sorted(
+                (self._rescale(self._low), self._rescale(self._high))
+            )
+
+
+    def _rescale(self, value: float) -> float:
+        return float(self.slope * value + self.intercept)
+
+
+    def _pixel_array(self, ds: pydicom.FileDataset, frame: int = 0) -> np.ndarray:
+        # El decodificador elige el códec según la sintaxis de
+        # transferencia; los datos sin comprimir se leen sin copias
+        return self.decoder.decode(ds, frame)
+
+
+    @staticmethod
+    def _frame_value(ds: pydicom.Dataset, frame: int, group: str,
+                     keyword: str, default=None):
+        # Valor de un atributo para un frame: en los objetos multiframe
+        # (enhanced) se busca en sus grupos funcionales, por frame y
+        # compartidos, y si no en el propio dataset
+        for sequence, item in (('PerFrameFunctionalGroupsSequence', frame),
+                               ('SharedFunctionalGroupsSequence', 0)):
+            groups = ds.get(sequence)
+            if groups is None or len(groups) <= item:
+                continue
+            macro = groups[item].get(group)
+            if macro and keyword in macro[0]:
+                return macro[0].get(keyword)
+        return ds.get(keyword, default)
+
+
+    def _frame_rescale(self, index: int) -> tuple[float, float]:
+        # Pendiente y ordenada de la regresión lineal de un corte
+        position, frame = self.frames[index]
+        ds = self.slices[position]
+        group = 'PixelValueTransformationSequence'
+        return (float(self._frame_value(ds, frame, group, 'RescaleSlope', 1)),
+                float(self._frame_value(ds, frame, group, 'RescaleIntercept', 0)))
+
+
+    def raw_plane(self, plane: str, slice_index: int) -> np.ndarray:
+        # Vista del volumen tal como se guarda, sin la regresión lineal.
+        # En modo perezoso los cortes axiales que faltan se decodifican al
+        # momento, y los demás planos inician el ensamblado del volumen
+        cache = self._slice_cache
+        if cache is not None and self.ready < len(self.frames):
+            if plane == 'axial' and slice_index >= self.ready:
+                return cache.get(slice_index)
+            if plane != 'axial' and self.auto_assemble:
+                self.assemble()
 
-    def plane(self, plane: str, slice_index: int) -> np.ndarray:
         match plane:
             case 'axial':
-                return self.img3d[:, :, slice_index]
+                return self.volume[slice_index]
             case 'sagital':
-                return self.img3d[:, slice_index, :].T
+                return self.volume[:, :, slice_index]
             case 'coronal':
-                return self.img3d[slice_index, :, :].T
+                return self.volume[:, slice_index, :]
+
+
+    def plane(self, plane: str, slice_index: int) -> np.ndarray:
+        # Se aplica la regresión lineal sobre el plano pedido
+        return self.slope * self.raw_plane(plane, slice_index) + self.intercept
+
+
+    def isotropic(self, spacing: float | None = None) -> 'DicomLoader':
+        # Volumen remuestreado a vóxeles cúbicos de lado spacing mm, por
+        # defecto la menor separación entre píxeles o cortes
+        self.load()
+        volume, spacing = self.kernels.isotropic(
+            self.volume, (self.st, *self.ps), spacing
+        )
+        return self._derive(volume, spacing)
+
+
+    def denoised(self, sigma: float = DEFAULT_DENOISE_SIGMA) -> 'DicomLoader':
+        # Volumen suavizado con un filtro gaussiano de sigma mm
+        self.load()
+        volume = self.kernels.denoise(self.volume, sigma, (self.st, *self.ps))
+        return self._derive(volume, (self.st, *self.ps))
+
+
+    def _derive(self, volume: np.ndarray,
+                spacing: tuple[float, float, float]) -> 'DicomLoader':
+        # Cargador de un volumen calculado a partir de éste, ya completo:
+        # comparte cabeceras y regresión lineal, pero no se guarda en la
+        # caché ni vuelve a leer los archivos
+        dcm = copy.copy(self)
+        z, y, x = volume.shape
+        dcm.volume = volume
+        dcm.shape = (y, x, z)
+        dcm._set_spacing(list(spacing[1:]), spacing[0])
+        # Cada corte nuevo se asocia al frame original más cercano
+        source = (np.arange(z) + 0.5) * len(self.frames) / z
+        dcm.frames = [self.frames[min(int(i), len(self.frames) - 1)] for i in source]
+        dcm.ready = z
+        dcm.lazy = dcm.auto_assemble = False
+        dcm._slice_cache = dcm._assembly = dcm._cache = None
+        dcm._load_lock = threading.Lock()
+        dcm._limits_lock = threading.Lock()
+
+        # Límites e histograma del nuevo volumen, por bloques en paralelo
+        dcm._slice_min, dcm._slice_max = self.kernels.slice_limits(volume)
+        dcm._low, dcm._high = dcm._slice_min.min(), dcm._slice_max.max()
+        dcm.min, dcm.max = sorted((dcm._rescale(dcm._low), dcm._rescale(dcm._high)))
+        dcm.stats = VolumeStats(dcm.dtype, dcm.slope, dcm.intercept, dcm.value_range)
+        self.kernels.map(
+            lambda lo, hi: dcm.stats.add(volume[lo:hi]), z, volume[0].nbytes
+        )
+        return dcm
 
 
-    def anonymize(self, override: bool=True) -> None:
-        pass
+    def anonymize(self, override: bool = True, output: str | None = None,
+                  profile: dict | None = None, salt: str | None = None) -> dict:
+        # Anonimización de los archivos de la serie, sin decodificar los
+        # píxeles. Se sobrescriben los originales o se escriben en output
+        if not override and output is None:
+            raise ValueError('Se requiere un directorio de salida')
+        if override:
+            pairs = [(f, f) for f in self.files]
+        else:
+            # Se conserva la ruta relativa al directorio común de la serie,
+            # para que los archivos con el mismo nombre no se sobrescriban
+            paths = [os.path.abspath(f) for f in self.files]
+            root = os.path.commonpath([os.path.dirname(p) for p in paths])
+            pairs = [
+                (f, os.path.join(output, os.path.relpath(p, root)))
+                for f, p in zip(self.files, paths)
+            ]
+        return Anonymizer(profile, salt).files(pairs, self.workers)
@@ -0,0 +1,136 @@
+# This Python file uses the following encoding: utf-8
+import os
+import json
+import threading
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+import pydicom
+
+from VolumeCache import DEFAULT_DIRECTORY
+
+# Etiquetas que se leen de cada archivo para agruparlo por paciente,
+# estudio y serie
+SCAN_TAGS = [
+    'PatientID', 'PatientName', 'StudyInstanceUID', 'StudyDate',
+    'StudyDescription', 'SeriesInstanceUID', 'SeriesNumber',
+    'SeriesDescription', 'Modality',
+]
+
+DEFAULT_INDEX = os.path.join(DEFAULT_DIRECTORY, 'scan-index.json')
+
+
+class DicomScanner:
+    def __init__(self, index_path: str = DEFAULT_INDEX,
+                 workers: int | None = None) -> None:
+        self.index_path = index_path
+        # La lectura es sobre todo de E/S, así que se usan más hilos que
+        # núcleos
+        self.workers = workers or 4 * (os.cpu_count() or 1)
+
+        # Índice persistente: ruta -> [mtime, tamaño, etiquetas o None si
+        # el archivo no es DICOM]
+        try:
+            with open(self.index_path) as f:
+                self._files = json.load(f)
+        except (OSError, ValueError):
+            self._files = {}
+        self._lock = threading.Lock()
+
+
+    def scan(self, root: str,
+             progress: Callable[[int, int], None] | None = None) -> list[dict]:
+        with self._lock:
+            return self._scan(root, progress)
+
+
+    def _scan(self, root: str,
+              progress: Callable[[int, int], None] | None) -> list[dict]:
+        # Se recorre el árbol y sólo se leen los archivos nuevos o
+        # modificados desde el último escaneo
+        root = os.path.abspath(root)
+        stats = {}
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                stats[path] = [st.st_mtime_ns, st.st_size]
+
+        missing = [
+            path for path, stat in stats.items()
+            if self._files.get(path, [None, None])[:2] != stat
+        ]
+        with ThreadPoolExecutor(self.workers) as executor:
+            for done, (path, tags) in enumerate(
+                    zip(missing, executor.map(self._read_tags, missing)), 1):
+                self._files[path] = [*stats[path], tags]
+                if progress is not None:
+                    progress(done, len(missing))
+
+        # Se eliminan del índice los archivos que ya no existen
+        prefix = root + os.sep
+        for path in [p for p in self._files if p.startswith(prefix)]:
+            if path not in stats:
+                del self._files[path]
+        self._save()
+
+        return self.series(stats)
+
+
+    @staticmethod
+    def _read_tags(path: str) -> dict | None:
+        # Lectura parcial: sólo las etiquetas de agrupación, sin píxeles.
+        # Los archivos no DICOM (DICOMDIR, miniaturas, texto) se omiten
+        try:
+            ds = pydicom.dcmread(
+                path, stop_before_pixels=True, specific_tags=SCAN_TAGS
+            )
+        except (pydicom.errors.InvalidDicomError, OSError, ValueError):
+            return None
+        if 'SeriesInstanceUID' not in ds:
+            return None
+        return {tag: str(ds.get(tag, '')) for tag in SCAN_TAGS}
+
+
+    def series(self, paths: list[str]) -> list[dict]:
+        # Agrupación de los archivos indexados por serie, ordenada por
+        # paciente, estudio y número de serie
+        series = {}
+        for path in paths:
+            tags = self._files[path][2]
+            if tags is None:
+                continue
+            uid = tags['SeriesInstanceUID']
+            if uid not in series:
+                series[uid] = {**tags, 'files': []}
+            series[uid]['files'].append(path)
+
+        def order(s: dict) -> tuple:
+            number = int(s['SeriesNumber']) if s['SeriesNumber'].isdigit() else 0
+            return (s['PatientName'], s['StudyDate'], s['StudyInstanceUID'], number)
+
+        result = sorted(series.values(), key=order)
+        for s in result:
+            s['files'].sort()
+        return result
+
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp = self.index_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self._files, f)
+        os.replace(tmp, self.index_path)
+
+
+def series_label(series: dict) -> str:
+    # Descripción legible de una serie para listarla en la interfaz
+    study = series['StudyDescription'] or series['StudyDate']
+    return (
+        f"{series['PatientName']} - {study} - "
+        f"{series['SeriesNumber']} {series['SeriesDescription']} "
+        f"({series['Modality']}, {len(series['files'])} archivos)"
+    )
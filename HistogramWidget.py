@@ -0,0 +1,60 @@
+# This Python file uses the following encoding: utf-8
+import numpy as np
+
+from PySide2.QtCore import Qt, QRectF
+from PySide2.QtGui import QPainter, QColor, QPen
+from PySide2.QtWidgets import QWidget
+
+
+class HistogramWidget(QWidget):
+    def __init__(self, parent: QWidget | None = None) -> None:
+        super().__init__(parent)
+        self.counts = np.zeros(0)
+        self.range = (0.0, 1.0)
+        self.window = None
+
+
+    def set_histogram(self, counts: np.ndarray, vmin: float, vmax: float) -> None:
+        # Histograma entre vmin y vmax, con intervalos de igual anchura
+        self.counts = np.asarray(counts, np.float64)
+        self.range = (vmin, vmax)
+        self.update()
+
+
+    def set_window(self, vmin: float, vmax: float) -> None:
+        # Límites de la ventana actual, marcados sobre el histograma
+        self.window = (vmin, vmax)
+        self.update()
+
+
+    def clear(self) -> None:
+        self.counts = np.zeros(0)
+        self.window = None
+        self.update()
+
+
+    def paintEvent(self, event) -> None:
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.palette().base())
+        w, h = self.width(), self.height()
+        low, high = self.range
+        if not len(self.counts) or high <= low:
+            return
+
+        # Escala logarítmica, para que el aire o el fondo no oculten el
+        # resto del histograma
+        heights = np.log1p(self.counts)
+        if heights.max() > 0:
+            heights *= (h - 1) / heights.max()
+        step = w / len(heights)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(self.palette().text())
+        for i, height in enumerate(heights):
+            if height > 0:
+                painter.drawRect(QRectF(i * step, h - height, step, height))
+
+        if self.window is not None:
+            painter.setPen(QPen(QColor(Qt.red), 1))
+            for value in self.window:
+                x = (value - low) / (high - low) * (w - 1)
+                painter.drawLine(round(x), 0, round(x), h)
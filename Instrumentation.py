@@ -0,0 +1,137 @@
+# This Python file uses the following encoding: utf-8
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import nullcontext
+
+# Eventos que se conservan para exportar la traza
+MAX_EVENTS = 200_000
+# Peso de la última medición en la latencia media de cada etapa
+SMOOTHING = 0.1
+
+# Contexto vacío compartido: con la instrumentación desactivada, medir una
+# etapa cuesta una llamada y no reserva memoria
+_DISABLED = nullcontext()
+
+
+class _Timer:
+    __slots__ = ('instrumentation', 'name', 'start')
+
+
+    def __init__(self, instrumentation: 'Instrumentation', name: str) -> None:
+        self.instrumentation = instrumentation
+        self.name = name
+
+
+    def __enter__(self) -> '_Timer':
+        self.start = time.perf_counter_ns()
+        return self
+
+
+    def __exit__(self, *exc) -> None:
+        self.instrumentation.record(self.name, self.start, time.perf_counter_ns())
+
+
+class Instrumentation:
+    def __init__(self) -> None:
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+        self.reset()
+
+
+    def enable(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+
+
+    def reset(self) -> None:
+        with self._lock:
+            # Por etapa: [llamadas, ns totales, último, media suavizada, máximo]
+            self._timers = {}
+            self._counters = {}
+            self._events = deque(maxlen=MAX_EVENTS)
+
+
+    def timer(self, name: str):
+        # Uso: with instrument.timer('decode'): ...
+        if not self.enabled:
+            return _DISABLED
+        return _Timer(self, name)
+
+
+    def record(self, name: str, start: int, end: int) -> None:
+        elapsed = end - start
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                self._timers[name] = [1, elapsed, elapsed, elapsed, elapsed]
+            else:
+                timer[0] += 1
+                timer[1] += elapsed
+                timer[2] = elapsed
+                timer[3] += SMOOTHING * (elapsed - timer[3])
+                timer[4] = max(timer[4], elapsed)
+            self._events.append((name, start, elapsed, threading.get_ident()))
+
+
+    def count(self, name: str, n: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+
+    def timers(self) -> dict[str, dict[str, float]]:
+        # Estadísticas de cada etapa, en milisegundos
+        with self._lock:
+            return {
+                name: {
+                    'count': count,
+                    'total_ms': total / 1e6,
+                    'last_ms': last / 1e6,
+                    'avg_ms': avg / 1e6,
+                    'max_ms': peak / 1e6,
+                }
+                for name, (count, total, last, avg, peak) in self._timers.items()
+            }
+
+
+    def counters(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+
+    def export_trace(self, path: str) -> None:
+        # Formato de eventos de traza de Chrome (chrome://tracing, Perfetto):
+        # un evento completo por medición, con tiempos en microsegundos
+        with self._lock:
+            events = list(self._events)
+            counters = dict(self._counters)
+        pid = os.getpid()
+        trace = [
+            {
+                'name': name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                'ts': (start - self._origin) / 1000, 'dur': elapsed / 1000,
+            }
+            for name, start, elapsed, tid in events
+        ]
+        trace += [
+            {
+                'name': name, 'ph': 'C', 'pid': pid, 'tid': 0,
+                'ts': (time.perf_counter_ns() - self._origin) / 1000,
+                'args': {'value': value},
+            }
+            for name, value in counters.items()
+        ]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+
+
+# Instancia compartida por todos los módulos. Con QDICOM_TRACE se activa al
+# importar y la ventana exporta la traza a ese archivo al cerrarse
+instrument = Instrumentation()
+TRACE_PATH = os.environ.get('QDICOM_TRACE')
+if TRACE_PATH:
+    instrument.enable()
@@ -0,0 +1,111 @@
+# This Python file uses the following encoding: utf-8
+import threading
+
+from PySide2.QtCore import QObject, QRunnable, Signal
+
+from DicomLoader import DicomLoader, InvalidDICOM, DICOMNotFound, LoadCancelled
+from DicomScanner import DicomScanner
+
+
+class LoadSignals(QObject):
+    # Cabeceras leídas y volumen reservado, todavía sin píxeles
+    opened = Signal(object)
+    # Cortes consecutivos ya decodificados y total de cortes
+    progress = Signal(int, int)
+    finished = Signal(object)
+    failed = Signal(str)
+    cancelled = Signal()
+
+
+class LoadWorker(QRunnable):
+    def __init__(self, path: str | list[str], **kwargs) -> None:
+        super().__init__()
+        self.path = path
+        self.kwargs = kwargs
+        self.signals = LoadSignals()
+        self._cancel = threading.Event()
+
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+
+    def run(self) -> None:
+        # Se carga la serie fuera del hilo de la interfaz; las señales
+        # se entregan en el hilo de la ventana
+        try:
+            loader = DicomLoader(self.path, deferred=True, **self.kwargs)
+            if self._cancel.is_set():
+                raise LoadCancelled
+            self.signals.opened.emit(loader)
+            loader.load(self.signals.progress.emit, self._cancel)
+        except LoadCancelled:
+            self.signals.cancelled.emit()
+        except (InvalidDICOM, DICOMNotFound, OSError) as e:
+            self.signals.failed.emit(str(e))
+        except Exception as e:
+            # Cualquier otro error (cabecera incoherente, fallo de un
+            # decodificador...) también se informa, para que la interfaz
+            # no quede esperando la carga
+            self.signals.failed.emit(f'Error al cargar la serie: {e}')
+        else:
+            self.signals.finished.emit(loader)
+
+
+class ScanSignals(QObject):
+    # Archivos nuevos leídos y total de archivos por leer
+    progress = Signal(int, int)
+    finished = Signal(object)
+    failed = Signal(str)
+
+
+class ScanWorker(QRunnable):
+    def __init__(self, scanner: DicomScanner, root: str) -> None:
+        super().__init__()
+        self.scanner = scanner
+        self.root = root
+        self.signals = ScanSignals()
+
+
+    def cancel(self) -> None:
+        # El escaneo termina de actualizar el índice; la ventana descarta
+        # su resultado
+        pass
+
+
+    def run(self) -> None:
+        try:
+            series = self.scanner.scan(self.root, self.signals.progress.emit)
+        except OSError as e:
+            self.signals.failed.emit(str(e))
+        except Exception as e:
+            self.signals.failed.emit(f'Error al buscar series: {e}')
+        else:
+            self.signals.finished.emit(series)
+
+
+class ProcessWorker(QRunnable):
+    def __init__(self, dcm: DicomLoader, isotropic: bool = False,
+                 denoise: bool = False) -> None:
+        super().__init__()
+        self.dcm = dcm
+        self.isotropic = isotropic
+        self.denoise = denoise
+        self.signals = LoadSignals()
+
+
+    def run(self) -> None:
+        # Se calcula el volumen procesado fuera del hilo de la interfaz;
+        # primero el remuestreo, para filtrar con vóxeles cúbicos
+        try:
+            dcm = self.dcm
+            if self.isotropic:
+                dcm = dcm.isotropic()
+            if self.denoise:
+                dcm = dcm.denoised()
+        except MemoryError:
+            self.signals.failed.emit('Memoria insuficiente para procesar el volumen')
+        except Exception as e:
+            self.signals.failed.emit(f'Error al procesar el volumen: {e}')
+        else:
+            self.signals.finished.emit(dcm)
@@ -0,0 +1,73 @@
+# This Python file uses the following encoding: utf-8
+import time
+
+from PySide2.QtCore import Qt, QTimer
+from PySide2.QtGui import QFont
+from PySide2.QtWidgets import QLabel, QWidget
+
+from Instrumentation import Instrumentation, TRACE_PATH
+
+# Intervalo, en ms, entre actualizaciones del HUD
+HUD_INTERVAL = 500
+# Etapas que se muestran, en el orden del recorrido de un corte
+HUD_STAGES = (
+    'read.header', 'decode', 'assemble.slice', 'reslice', 'window', 'paint',
+    'frame',
+)
+
+
+class PerformanceHUD(QLabel):
+    def __init__(self, instrumentation: Instrumentation,
+                 parent: QWidget | None = None) -> None:
+        super().__init__(parent)
+        self.instrumentation = instrumentation
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setFont(QFont('monospace', 8))
+        self.setStyleSheet(
+            'background-color: rgba(0, 0, 0, 160); color: #9f9; padding: 4px;'
+        )
+        self.hide()
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(HUD_INTERVAL)
+        self._timer.timeout.connect(self.refresh)
+        self._frames = 0
+        self._since = time.perf_counter()
+
+
+    def set_active(self, active: bool) -> None:
+        # Mostrar el HUD activa la instrumentación, que sigue activa si se
+        # pidió una traza con QDICOM_TRACE
+        self.instrumentation.enable(active or bool(TRACE_PATH))
+        self.setVisible(active)
+        if active:
+            self._frames = self._frame_count()
+            self._since = time.perf_counter()
+            self._timer.start()
+            self.refresh()
+        else:
+            self._timer.stop()
+
+
+    def _frame_count(self) -> int:
+        return self.instrumentation.timers().get('frame', {}).get('count', 0)
+
+
+    def refresh(self) -> None:
+        # Cuadros por segundo desde la última actualización y latencia
+        # media suavizada de cada etapa
+        now = time.perf_counter()
+        frames = self._frame_count()
+        fps = (frames - self._frames) / (now - self._since)
+        self._frames, self._since = frames, now
+
+        timers = self.instrumentation.timers()
+        lines = [f'{"fps":15s} {fps:7.1f}']
+        for stage in HUD_STAGES:
+            # Las etapas con variantes (ej. decode.raw) se muestran juntas
+            for name in sorted(timers):
+                if name == stage or name.startswith(stage + '.'):
+                    lines.append(f'{name:15s} {timers[name]["avg_ms"]:7.2f} ms')
+        self.setText('\n'.join(lines))
+        self.adjustSize()
+        self.raise_()
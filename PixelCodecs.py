@@ -0,0 +1,291 @@
+# This Python file uses the following encoding: utf-8
+import io
+import time
+import threading
+
+import numpy as np
+import pydicom
+from pydicom.tag import Tag
+from pydicom.uid import (
+    ImplicitVRLittleEndian, ExplicitVRLittleEndian, JPEGBaseline8Bit,
+    JPEG2000Lossless, JPEG2000
+)
+
+from Instrumentation import instrument
+
+try:
+    from pydicom.encaps import generate_frames
+except ImportError:
+    # pydicom < 3
+    from pydicom.encaps import generate_pixel_data_frame
+
+    def generate_frames(buffer: bytes, *, number_of_frames: int | None = None):
+        return generate_pixel_data_frame(buffer, number_of_frames)
+
+try:
+    from pydicom.pixels import pixel_array as read_frame
+except ImportError:
+    # pydicom < 3: se decodifica el objeto completo
+    read_frame = None
+
+UNCOMPRESSED_SYNTAXES = (ImplicitVRLittleEndian, ExplicitVRLittleEndian)
+# Longitud de los elementos de longitud indefinida (PixelData encapsulado)
+UNDEFINED_LENGTH = 0xFFFFFFFF
+
+
+def frame_count(ds: pydicom.Dataset) -> int:
+    return int(getattr(ds, 'NumberOfFrames', 1) or 1)
+
+
+def pixel_element(ds: pydicom.Dataset):
+    # Elemento PixelData sin leer su valor si su lectura se difirió; leerlo
+    # lo dejaría guardado en el dataset junto al volumen decodificado
+    try:
+        return ds.get_item('PixelData', keep_deferred=True)
+    except TypeError:
+        # pydicom < 3: get_item lee y guarda los elementos diferidos
+        return ds._dict.get(Tag('PixelData'))
+
+
+def pixel_bytes(ds: pydicom.Dataset) -> bytes:
+    # Valor de PixelData leído desde el archivo cuando está diferido, sin
+    # guardarlo en el dataset. Los datos encapsulados se leen hasta el
+    # final: la separación de fragmentos termina en su delimitador
+    elem = pixel_element(ds)
+    if elem.value is not None:
+        return elem.value
+    with open(ds.filename, 'rb') as f:
+        f.seek(elem.value_tell)
+        return f.read() if elem.length == UNDEFINED_LENGTH else f.read(elem.length)
+
+
+def stored_dtype(ds: pydicom.Dataset) -> np.dtype:
+    kind = 'i' if ds.PixelRepresentation else 'u'
+    return np.dtype(f'<{kind}{ds.BitsAllocated // 8}')
+
+
+class RawCodec:
+    # Datos sin comprimir en escala de grises: se leen directamente desde
+    # su posición en el archivo, sin pasar por los manejadores de pydicom.
+    # En objetos multiframe sólo se lee el frame pedido
+    name = 'raw'
+    encapsulated = False
+
+
+    def available(self) -> bool:
+        return True
+
+
+    def supports(self, ds: pydicom.Dataset) -> bool:
+        return (ds.file_meta.TransferSyntaxUID in UNCOMPRESSED_SYNTAXES
+                and ds.SamplesPerPixel == 1
+                and ds.BitsAllocated in (8, 16, 32)
+                and (not ds.PixelRepresentation
+                     or ds.BitsStored == ds.BitsAllocated))
+
+
+    def decode(self, ds: pydicom.Dataset, frame: int,
+               data: bytes | None) -> np.ndarray:
+        dtype = stored_dtype(ds)
+        count = ds.Rows * ds.Columns
+        offset = frame * count * dtype.itemsize
+        elem = pixel_element(ds)
+        if elem.value is not None:
+            img2d = np.frombuffer(elem.value, dtype, count, offset)
+        else:
+            with open(ds.filename, 'rb') as f:
+                f.seek(elem.value_tell + offset)
+                img2d = np.fromfile(f, dtype, count)
+        return img2d.reshape(ds.Rows, ds.Columns)
+
+
+class PylibjpegCodec:
+    # JPEG, JPEG-LS, JPEG 2000 y RLE con los plugins de pylibjpeg que
+    # estén instalados (libjpeg, openjpeg, rle)
+    name = 'pylibjpeg'
+    encapsulated = True
+
+
+    def __init__(self) -> None:
+        self._decoders = None
+
+
+    def available(self) -> bool:
+        if self._decoders is None:
+            try:
+                from pylibjpeg.utils import get_pixel_data_decoders
+                self._decoders = get_pixel_data_decoders()
+            except ImportError:
+                self._decoders = {}
+        return bool(self._decoders)
+
+
+    def supports(self, ds: pydicom.Dataset) -> bool:
+        return (ds.file_meta.TransferSyntaxUID in self._decoders
+                and ds.SamplesPerPixel == 1)
+
+
+    def decode(self, ds: pydicom.Dataset, frame: int,
+               data: bytes | None) -> np.ndarray:
+        decoder = self._decoders[ds.file_meta.TransferSyntaxUID]
+        img = np.asarray(decoder(data, ds))
+        if img.dtype == np.uint8:
+            img = img.ravel().view(stored_dtype(ds))
+        return img.reshape(ds.Rows, ds.Columns)
+
+
+class PillowCodec:
+    # JPEG baseline de 8 bits y JPEG 2000 sin signo con Pillow. El
+    # JPEG 2000 con signo se deja a los demás decodificadores
+    name = 'pillow'
+    encapsulated = True
+
+
+    def __init__(self) -> None:
+        self._syntaxes = None
+
+
+    def available(self) -> bool:
+        if self._syntaxes is None:
+            self._syntaxes = set()
+            try:
+                from PIL import features
+            except ImportError:
+                return False
+            if features.check_codec('jpg'):
+                self._syntaxes.add(JPEGBaseline8Bit)
+            if features.check_codec('jpg_2000'):
+                self._syntaxes.update((JPEG2000Lossless, JPEG2000))
+        return bool(self._syntaxes)
+
+
+    def supports(self, ds: pydicom.Dataset) -> bool:
+        syntax = ds.file_meta.TransferSyntaxUID
+        return (syntax in self._syntaxes and ds.SamplesPerPixel == 1
+                and (syntax == JPEGBaseline8Bit or not ds.PixelRepresentation))
+
+
+    def decode(self, ds: pydicom.Dataset, frame: int,
+               data: bytes | None) -> np.ndarray:
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as image:
+            img = np.asarray(image)
+        return img.astype(stored_dtype(ds), copy=False).reshape(ds.Rows, ds.Columns)
+
+
+class PydicomCodec:
+    # Último recurso: los manejadores de pydicom (incluido gdcm si está
+    # instalado), para cualquier sintaxis que pydicom sepa decodificar
+    name = 'pydicom'
+    encapsulated = False
+
+
+    def __init__(self) -> None:
+        # Sin decodificación por frame (pydicom < 3), los objetos
+        # multiframe se decodifican una vez y se reparten sus frames
+        self._arrays = {}
+        self._lock = threading.Lock()
+
+
+    def available(self) -> bool:
+        return True
+
+
+    def supports(self, ds: pydicom.Dataset) -> bool:
+        return True
+
+
+    def decode(self, ds: pydicom.Dataset, frame: int,
+               data: bytes | None) -> np.ndarray:
+        if read_frame is not None:
+            return read_frame(ds.filename, index=frame)
+        if frame_count(ds) == 1:
+            return pydicom.dcmread(ds.filename).pixel_array
+        with self._lock:
+            if ds.filename not in self._arrays:
+                self._arrays[ds.filename] = pydicom.dcmread(ds.filename).pixel_array
+            return self._arrays[ds.filename][frame]
+
+
+    def release(self) -> None:
+        with self._lock:
+            self._arrays.clear()
+
+
+# Decodificadores en orden de preferencia
+DEFAULT_CODECS = (RawCodec, PylibjpegCodec, PillowCodec, PydicomCodec)
+
+
+class FrameDecoder:
+    def __init__(self, codecs: tuple = DEFAULT_CODECS) -> None:
+        self.codecs = [codec() for codec in codecs]
+        self.codecs = [codec for codec in self.codecs if codec.available()]
+        self._lock = threading.Lock()
+        # Decodificador elegido por sintaxis de transferencia y
+        # parámetros de la imagen
+        self._chosen = {}
+        # Frames comprimidos de cada objeto multiframe, separados una sola
+        # vez y compartidos por todos sus cortes
+        self._frames = {}
+        # Frames decodificados y segundos por decodificador
+        self._timing = {}
+
+
+    def codec(self, ds: pydicom.Dataset):
+        key = (ds.file_meta.TransferSyntaxUID, ds.SamplesPerPixel,
+               ds.BitsAllocated, ds.BitsStored, ds.PixelRepresentation)
+        if key not in self._chosen:
+            self._chosen[key] = next(c for c in self.codecs if c.supports(ds))
+        return self._chosen[key]
+
+
+    def decode(self, ds: pydicom.Dataset, frame: int = 0) -> np.ndarray:
+        codec = self.codec(ds)
+        start = time.perf_counter()
+        data = None
+        if codec.encapsulated:
+            data = self._encapsulated_frame(ds, frame)
+        with instrument.timer(f'decode.{codec.name}'):
+            img2d = codec.decode(ds, frame, data)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            frames, seconds = self._timing.get(codec.name, (0, 0.0))
+            self._timing[codec.name] = (frames + 1, seconds + elapsed)
+        return img2d
+
+
+    def _encapsulated_frame(self, ds: pydicom.Dataset, frame: int) -> bytes:
+        # Los fragmentos de un frame se unen sin copiar el resto del
+        # PixelData. En objetos multiframe la separación se hace una vez
+        count = frame_count(ds)
+        if count == 1:
+            return next(generate_frames(pixel_bytes(ds), number_of_frames=1))
+        with self._lock:
+            frames = self._frames.get(ds.filename)
+            if frames is None:
+                frames = list(generate_frames(pixel_bytes(ds), number_of_frames=count))
+                self._frames[ds.filename] = frames
+        return frames[frame]
+
+
+    def release(self) -> None:
+        # Se liberan los frames separados de los objetos multiframe
+        with self._lock:
+            self._frames.clear()
+        for codec in self.codecs:
+            if hasattr(codec, 'release'):
+                codec.release()
+
+
+    def timing(self) -> dict[str, dict[str, float]]:
+        # Frames y tiempo total y medio de cada decodificador usado
+        with self._lock:
+            return {
+                name: {
+                    'frames': frames,
+                    'seconds': seconds,
+                    'ms_per_frame': 1000 * seconds / frames,
+                }
+                for name, (frames, seconds) in self._timing.items()
+            }
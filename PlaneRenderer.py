@@ -0,0 +1,115 @@
+# This Python file uses the following encoding: utf-8
+import numpy as np
+
+from PySide2.QtCore import Qt, QObject, QEvent, Signal
+from PySide2.QtGui import QImage, QPixmap, QTransform, QPen, QColor
+from PySide2.QtWidgets import (
+    QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QGraphicsLineItem
+)
+
+from Instrumentation import instrument
+
+# Color de la cruz de referencia
+CROSSHAIR_COLOR = QColor(255, 200, 0, 180)
+
+
+class PlaneRenderer(QObject):
+    # Punto pulsado o arrastrado con el botón izquierdo, en coordenadas de
+    # la escena (píxeles del plano mostrado), y fin del arrastre
+    picked = Signal(float, float)
+    released = Signal()
+
+    def __init__(self, view: QGraphicsView) -> None:
+        super().__init__(view)
+        self.view = view
+
+        # La escena y el item se crean una sola vez; cada corte sólo
+        # reemplaza el pixmap mostrado
+        self.scene = QGraphicsScene(self)
+        self.item = QGraphicsPixmapItem()
+        self.item.setTransformationMode(Qt.SmoothTransformation)
+        self.scene.addItem(self.item)
+        self.view.setScene(self.scene)
+        self.view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.view.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+
+        # Cruz de referencia: dos líneas sobre la imagen que se mueven sin
+        # volver a pintarla. El trazo cosmético mantiene un píxel de ancho
+        # con cualquier escala
+        pen = QPen(CROSSHAIR_COLOR)
+        pen.setCosmetic(True)
+        self.crosshair = (QGraphicsLineItem(), QGraphicsLineItem())
+        for line in self.crosshair:
+            line.setPen(pen)
+            line.setZValue(1)
+            line.hide()
+            self.scene.addItem(line)
+        self._crosshair = None
+        self._crosshair_visible = True
+
+        # Se ajusta la imagen a la vista cada vez que cambia de tamaño
+        self.view.viewport().installEventFilter(self)
+        self._shape = None
+
+
+    def set_image(self, data: np.ndarray,
+                  shape: tuple[int, int] | None = None) -> None:
+        # Se muestra una matriz uint8 en escala de grises, sin copias
+        # intermedias salvo la del pixmap. Si se indica shape, la imagen
+        # se escala a ese tamaño (ej. una vista previa de menor resolución)
+        with instrument.timer('paint'):
+            data = np.ascontiguousarray(data, dtype=np.uint8)
+            h, w = data.shape
+            image = QImage(data.data, w, h, data.strides[0], QImage.Format_Grayscale8)
+            self.item.setPixmap(QPixmap.fromImage(image))
+
+        shape = shape or (h, w)
+        self.item.setTransform(QTransform.fromScale(shape[1] / w, shape[0] / h))
+        if shape != self._shape:
+            self._shape = shape
+            self.scene.setSceneRect(0, 0, shape[1], shape[0])
+            self.fit()
+            self._place_crosshair()
+
+
+    def set_crosshair(self, x: float, y: float) -> None:
+        # Centro de la cruz en coordenadas de la escena
+        self._crosshair = (x, y)
+        self._place_crosshair()
+
+
+    def set_crosshair_visible(self, visible: bool) -> None:
+        self._crosshair_visible = visible
+        self._place_crosshair()
+
+
+    def _place_crosshair(self) -> None:
+        visible = (self._crosshair_visible and self._crosshair is not None
+                   and self._shape is not None)
+        for line in self.crosshair:
+            line.setVisible(visible)
+        if not visible:
+            return
+        x, y = self._crosshair
+        h, w = self._shape
+        horizontal, vertical = self.crosshair
+        horizontal.setLine(0, y, w, y)
+        vertical.setLine(x, 0, x, h)
+
+
+    def fit(self) -> None:
+        self.view.fitInView(self.scene.sceneRect(), Qt.KeepAspectRatio)
+
+
+    def eventFilter(self, obj: QObject, event: QEvent) -> bool:
+        match event.type():
+            case QEvent.Resize:
+                self.fit()
+            case QEvent.MouseButtonPress | QEvent.MouseMove if (
+                    event.buttons() == Qt.LeftButton and self._shape is not None):
+                pos = self.view.mapToScene(event.pos())
+                self.picked.emit(pos.x(), pos.y())
+                return True
+            case QEvent.MouseButtonRelease:
+                self.released.emit()
+        return False
@@ -0,0 +1,76 @@
+# This Python file uses the following encoding: utf-8
+from typing import Callable
+
+from PySide2.QtCore import QObject, QTimer
+
+from Instrumentation import instrument
+
+# Intervalo entre dibujos, aproximadamente un cuadro de pantalla a 60 Hz
+FRAME_INTERVAL = 16
+
+
+class RenderScheduler(QObject):
+    def __init__(self, draw: Callable[[str, int], None],
+                 set_window: Callable[[float, float], None],
+                 interval: int = FRAME_INTERVAL, parent: QObject = None) -> None:
+        super().__init__(parent)
+        self._draw = draw
+        self._set_window = set_window
+
+        # Último estado pedido de cada vista y de la ventana espectral
+        self._planes = {}
+        self._window = None
+
+        # Un solo disparo por cuadro, que dibuja lo pendiente
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self.flush)
+
+        # Contadores para comprobar la agrupación de pedidos
+        self.requested = 0
+        self.dropped = 0
+        self.executed = 0
+        self.frames = 0
+
+
+    def request(self, plane: str, index: int) -> None:
+        # Un pedido pendiente para la misma vista se reemplaza
+        self.requested += 1
+        if plane in self._planes:
+            self.dropped += 1
+        self._planes[plane] = index
+        self._schedule()
+
+
+    def request_window(self, vmin: float, vmax: float) -> None:
+        self._window = (vmin, vmax)
+        self._schedule()
+
+
+    def _schedule(self) -> None:
+        if not self._timer.isActive():
+            self._timer.start()
+
+
+    def flush(self) -> None:
+        # Se aplica el último estado pedido de cada vista
+        self._timer.stop()
+        planes, self._planes = self._planes, {}
+        window, self._window = self._window, None
+        with instrument.timer('frame'):
+            if window is not None:
+                self._set_window(*window)
+            for plane, index in planes.items():
+                self._draw(plane, index)
+                self.executed += 1
+        self.frames += 1
+
+
+    def stats(self) -> dict:
+        return {
+            'requested': self.requested,
+            'dropped': self.dropped,
+            'executed': self.executed,
+            'frames': self.frames,
+        }
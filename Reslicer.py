@@ -0,0 +1,117 @@
+# This Python file uses the following encoding: utf-8
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from DicomLoader import DicomLoader
+from Instrumentation import instrument
+
+# Planos recientes que se conservan ya remuestreados
+DEFAULT_CACHE_SIZE = 64
+# Tamaño máximo de las copias ordenadas por eje (sagital y coronal juntas)
+DEFAULT_MAX_COPY_BYTES = 2 * 1024**3
+
+
+class Reslicer:
+    def __init__(self, dcm: DicomLoader,
+                 cache_size: int = DEFAULT_CACHE_SIZE,
+                 max_copy_bytes: int = DEFAULT_MAX_COPY_BYTES) -> None:
+        self.dcm = dcm
+        self.cache_size = cache_size
+        self.max_copy_bytes = max_copy_bytes
+        self._cache = OrderedDict()
+        self._copies = {}
+        self._lock = threading.Lock()
+
+        # Índices de fila para llevar cada plano a píxeles cuadrados.
+        # Sagital (z, y): filas separadas st y columnas ps[0]; coronal
+        # (z, x): filas st y columnas ps[1]; axial (y, x): filas ps[0] y
+        # columnas ps[1]
+        y, x, z = dcm.shape
+        row, col = dcm.ps
+        self._rows = {
+            'axial': self._row_index(y, row / col),
+            'sagital': self._row_index(z, dcm.st / row),
+            'coronal': self._row_index(z, dcm.st / col),
+        }
+
+
+    def shape(self, plane: str) -> tuple[int, int]:
+        # Tamaño de los planos devueltos, ya remuestreados
+        y, x, z = self.dcm.shape
+        rows, cols = {'axial': (y, x), 'sagital': (z, y), 'coronal': (z, x)}[plane]
+        index = self._rows[plane]
+        return (rows if index is None else len(index)), cols
+
+
+    @staticmethod
+    def _row_index(n: int, scale: float) -> np.ndarray | None:
+        # Vecino más cercano de cada fila de salida; None si no hace falta
+        # remuestrear
+        out = max(round(n * scale), 1)
+        if out == n:
+            return None
+        return np.minimum(((np.arange(out) + 0.5) * n / out).astype(np.intp), n - 1)
+
+
+    def build(self) -> None:
+        # Copias del volumen ordenadas por eje, para que los planos sagital
+        # y coronal sean contiguos. Se crean en segundo plano y sólo con el
+        # volumen completo
+        if self.dcm.ready < len(self.dcm.frames):
+            return
+        if 2 * self.dcm.volume.nbytes > self.max_copy_bytes:
+            return
+        threading.Thread(target=self._build_copies, daemon=True).start()
+
+
+    def nbytes(self) -> int:
+        # Memoria de las copias ordenadas y de los planos en caché
+        with self._lock:
+            cached = sum(data.nbytes for data in self._cache.values())
+        return cached + sum(copy.nbytes for copy in self._copies.values())
+
+
+    def _build_copies(self) -> None:
+        volume = self.dcm.volume
+        self._copies['sagital'] = np.ascontiguousarray(volume.transpose(2, 0, 1))
+        self._copies['coronal'] = np.ascontiguousarray(volume.transpose(1, 0, 2))
+
+
+    def plane(self, plane: str, index: int) -> np.ndarray:
+        with instrument.timer('reslice'):
+            return self._plane(plane, index)
+
+
+    def _plane(self, plane: str, index: int) -> np.ndarray:
+        # Plano contiguo en el tipo guardado, con la relación de aspecto
+        # física. Mientras el volumen se carga no se guarda en la caché
+        complete = self.dcm.ready == len(self.dcm.frames)
+        key = (plane, index)
+        if complete:
+            with self._lock:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    return self._cache[key]
+
+        if plane in self._copies:
+            data = self._copies[plane][index]
+        else:
+            data = self.dcm.raw_plane(plane, index)
+        data = self.resample(plane, data)
+
+        if complete:
+            with self._lock:
+                self._cache[key] = data
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return data
+
+
+    def resample(self, plane: str, data: np.ndarray) -> np.ndarray:
+        # Plano en la orientación de raw_plane llevado a píxeles cuadrados
+        rows = self._rows[plane]
+        if rows is None:
+            return np.ascontiguousarray(data)
+        return np.take(data, rows, axis=0)
@@ -0,0 +1,176 @@
+# This Python file uses the following encoding: utf-8
+import threading
+
+import numpy as np
+
+from Instrumentation import instrument
+
+# Reducción de los cortes de la losa en cada modo de proyección
+MODES = {'max': np.maximum, 'min': np.minimum, 'mean': None}
+# Orden de los ejes del volumen (z, y, x) que deja primero el eje que
+# recorre cada plano y el plano en la misma orientación que raw_plane
+ORDER = {'axial': (0, 1, 2), 'sagital': (2, 0, 1), 'coronal': (1, 0, 2)}
+# Tamaño máximo de las tablas de todos los planos
+DEFAULT_MAX_TABLE_BYTES = 2 * 1024**3
+
+
+class SlabEngine:
+    def __init__(self, volume: np.ndarray,
+                 max_table_bytes: int = DEFAULT_MAX_TABLE_BYTES) -> None:
+        self.volume = volume
+        self.max_table_bytes = max_table_bytes
+        self.mode = None
+        # Tablas por (modo, plano): niveles de máximos o mínimos por
+        # bloques para MIP y MinIP, sumas acumuladas para el promedio
+        self._tables = {}
+        self._lock = threading.Lock()
+
+        # Las sumas acumuladas usan el entero más pequeño que no se
+        # desborda con todos los cortes
+        if volume.dtype.kind in 'iu' and volume.dtype.itemsize <= 2:
+            self._sum_dtype = np.dtype(np.int32)
+        elif volume.dtype.kind in 'iu':
+            self._sum_dtype = np.dtype(np.int64)
+        else:
+            self._sum_dtype = np.dtype(np.float64)
+
+
+    def prepare(self, mode: str) -> None:
+        # Las tablas del modo elegido se construyen en segundo plano y se
+        # liberan las del anterior; hasta entonces la losa se calcula
+        # directamente sobre el volumen
+        with self._lock:
+            self.mode = mode
+            for key in [key for key in self._tables if key[0] != mode]:
+                del self._tables[key]
+        threading.Thread(target=self._build, args=(mode,), daemon=True).start()
+
+
+    def _build(self, mode: str) -> None:
+        for plane in ORDER:
+            if self.mode != mode:
+                return
+            if self.nbytes() + self._table_bytes(mode, plane) > self.max_table_bytes:
+                continue
+            with instrument.timer(f'slab.build.{mode}'):
+                view = self._ordered(plane)
+                if mode == 'mean':
+                    table = self._prefix_sums(view)
+                else:
+                    table = self._block_levels(view, MODES[mode])
+            with self._lock:
+                if self.mode == mode:
+                    self._tables[mode, plane] = table
+
+
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(self._nbytes(table) for table in self._tables.values())
+
+
+    def _view(self, plane: str) -> np.ndarray:
+        return self.volume.transpose(ORDER[plane])
+
+
+    def _ordered(self, plane: str) -> np.ndarray:
+        # Copia contigua del volumen con el eje del plano primero, para
+        # que cada corte de las tablas sea contiguo. Se traspone corte a
+        # corte: es mucho más rápido que copiar la vista traspuesta
+        if plane == 'axial':
+            return self.volume
+        z, y, x = self.volume.shape
+        out = np.empty((x, z, y) if plane == 'sagital' else (y, z, x),
+                       self.volume.dtype)
+        for i in range(z):
+            out[:, i, :] = self.volume[i].T if plane == 'sagital' else self.volume[i]
+        return out
+
+
+    def _table_bytes(self, mode: str, plane: str) -> int:
+        # Sumas: un plano más que el volumen. Niveles: lo mismo que el
+        # volumen, más la copia ordenada en los planos no axiales
+        if mode == 'mean':
+            n = self._view(plane).shape[0]
+            return (self.volume.size + self.volume.size // n) * self._sum_dtype.itemsize
+        return self.volume.nbytes * (1 if plane == 'axial' else 2)
+
+
+    def _nbytes(self, table: np.ndarray | list[np.ndarray]) -> int:
+        if isinstance(table, np.ndarray):
+            return table.nbytes
+        return sum(level.nbytes for level in table if level is not self.volume)
+
+
+    def _prefix_sums(self, view: np.ndarray) -> np.ndarray:
+        # sums[i] es la suma de los cortes [0, i): la suma de cualquier
+        # losa se obtiene con una resta
+        sums = np.empty((view.shape[0] + 1,) + view.shape[1:], self._sum_dtype)
+        sums[0] = 0
+        # Se suma corte a corte: np.cumsum sobre el primer eje es varias
+        # veces más lento
+        for i in range(view.shape[0]):
+            np.add(sums[i], view[i], out=sums[i + 1])
+        return sums
+
+
+    @staticmethod
+    def _block_levels(view: np.ndarray, op: np.ufunc) -> list[np.ndarray]:
+        # El nivel k guarda el máximo (o mínimo) de cada bloque alineado de
+        # 2^k cortes; ocupa en total lo mismo que el volumen
+        levels = [view]
+        while len(levels[-1]) > 1:
+            level = levels[-1]
+            pairs = len(level) // 2
+            levels.append(op(level[0:2 * pairs:2], level[1:2 * pairs:2]))
+        return levels
+
+
+    def slab(self, mode: str, plane: str, index: int, thickness: int) -> np.ndarray:
+        # Proyección de la losa de thickness cortes centrada en index, en
+        # el tipo guardado y la orientación de raw_plane
+        with instrument.timer(f'slab.{mode}'):
+            view = self._view(plane)
+            lo = min(max(index - thickness // 2, 0), view.shape[0] - 1)
+            hi = min(lo + thickness, view.shape[0])
+            table = self._tables.get((mode, plane))
+
+            if mode == 'mean':
+                if table is None:
+                    total = view[lo:hi].sum(axis=0, dtype=self._sum_dtype)
+                else:
+                    total = table[hi] - table[lo]
+                mean = total / (hi - lo)
+                if self.volume.dtype.kind in 'iu':
+                    mean = np.rint(mean)
+                return mean.astype(self.volume.dtype)
+
+            op = MODES[mode]
+            if table is None:
+                return op.reduce(view[lo:hi], axis=0)
+            return self._query(table, op, lo, hi)
+
+
+    @staticmethod
+    def _query(levels: list[np.ndarray], op: np.ufunc, lo: int, hi: int) -> np.ndarray:
+        # Se recorre el intervalo [lo, hi) de abajo arriba: en cada nivel
+        # sobra como mucho un bloque por cada extremo, así que se combinan
+        # O(log n) planos sea cual sea el grosor
+        result = None
+        level = 0
+        while lo < hi:
+            blocks = []
+            if lo & 1:
+                blocks.append(levels[level][lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                blocks.append(levels[level][hi])
+            for block in blocks:
+                if result is None:
+                    result = np.array(block)
+                else:
+                    op(result, block, out=result)
+            lo >>= 1
+            hi >>= 1
+            level += 1
+        return result
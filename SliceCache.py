@@ -0,0 +1,91 @@
+# This Python file uses the following encoding: utf-8
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+import numpy as np
+
+# Cortes decodificados que se conservan en memoria
+DEFAULT_SLICE_CACHE = 32
+# Cortes que se decodifican por adelantado en la dirección de avance
+DEFAULT_READ_AHEAD = 4
+
+
+class SliceCache:
+    def __init__(self, decode: Callable[[int], np.ndarray], count: int,
+                 size: int = DEFAULT_SLICE_CACHE,
+                 read_ahead: int = DEFAULT_READ_AHEAD,
+                 workers: int = 1) -> None:
+        self.decode = decode
+        self.count = count
+        self.size = max(size, read_ahead + 1)
+        self.read_ahead = read_ahead
+        self._slices = OrderedDict()
+        self._pending = {}
+        self._last = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(workers)
+
+
+    def get(self, index: int) -> np.ndarray:
+        # Corte decodificado, desde la caché si está. Se adelanta la
+        # lectura de los siguientes en la dirección en la que se avanza.
+        # Una vez cerrada, el corte se decodifica al momento
+        if self._closed:
+            return self.decode(index)
+        direction = 1 if self._last is None or index >= self._last else -1
+        self._last = index
+        future = self._submit(index)
+        for step in range(1, self.read_ahead + 1):
+            neighbour = index + direction * step
+            if 0 <= neighbour < self.count:
+                self._submit(neighbour)
+        return future.result()
+
+
+    def pop(self, index: int) -> np.ndarray | None:
+        # Corte ya decodificado que se retira de la caché (ej. para
+        # copiarlo al volumen), o None si no está
+        with self._lock:
+            data = self._slices.pop(index, None)
+            if data is not None:
+                return data
+            future = self._pending.get(index)
+        return None if future is None else future.result()
+
+
+    def _submit(self, index: int) -> Future:
+        with self._lock:
+            if index in self._slices:
+                self._slices.move_to_end(index)
+                future = Future()
+                future.set_result(self._slices[index])
+                return future
+            if index not in self._pending:
+                self._pending[index] = self._executor.submit(self._decode, index)
+            return self._pending[index]
+
+
+    def _decode(self, index: int) -> np.ndarray:
+        try:
+            data = self.decode(index)
+        except BaseException:
+            with self._lock:
+                del self._pending[index]
+            raise
+        with self._lock:
+            del self._pending[index]
+            self._slices[index] = data
+            if len(self._slices) > self.size:
+                self._slices.popitem(last=False)
+        return data
+
+
+    def close(self) -> None:
+        # Se liberan los cortes y se descartan las lecturas adelantadas
+        with self._lock:
+            self._closed = True
+            self._slices.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,195 @@
+# This Python file uses the following encoding: utf-8
+import os
+import json
+import time
+import threading
+import hashlib
+import weakref
+
+import pydicom
+import numpy as np
+
+# Directorio y tamaño máximo por defecto de la caché
+DEFAULT_DIRECTORY = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'qdicom-viewer'
+)
+DEFAULT_MAX_BYTES = 4 * 1024**3
+
+
+class VolumeCache:
+    def __init__(self, directory: str = DEFAULT_DIRECTORY,
+                 max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        # La carga principal y la anticipada usan la caché a la vez: el
+        # índice sólo se modifica y se guarda con el cerrojo
+        self._lock = threading.RLock()
+        # Volúmenes mapeados que siguen abiertos: sus archivos no se borran
+        # al liberar espacio (en Windows no se puede borrar un archivo
+        # mapeado)
+        self._mapped = {}
+
+        # El índice guarda el tamaño y último acceso de cada serie, y el
+        # SOPInstanceUID de cada archivo para no releerlo si no cambió
+        self._index_path = os.path.join(self.directory, 'index.json')
+        try:
+            with open(self._index_path) as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {'series': {}, 'files': {}}
+
+
+    def key(self, fnames: list[str],
+            datasets: list[pydicom.Dataset] | None = None) -> str | None:
+        # La clave de una serie depende del SOPInstanceUID y la fecha de
+        # modificación de cada archivo
+        stats = {}
+        for fname in fnames:
+            path = os.path.abspath(fname)
+            st = os.stat(path)
+            stats[path] = [st.st_mtime_ns, st.st_size]
+
+        # Los UID de los archivos nuevos o modificados se toman de las
+        # cabeceras ya leídas; sin ellas la serie no puede estar en caché
+        uids = {
+            os.path.abspath(ds.filename): str(ds.get('SOPInstanceUID', ''))
+            for ds in datasets or []
+        }
+        with self._lock:
+            known = self._index['files']
+            for path, stat in stats.items():
+                if known.get(path, [None, None])[:2] == stat:
+                    continue
+                if path not in uids:
+                    return None
+                known[path] = [*stat, uids[path]]
+            files = sorted((known[p][2], known[p][0]) for p in stats)
+
+        digest = hashlib.sha1()
+        for uid, mtime in files:
+            digest.update(f'{uid}:{mtime};'.encode())
+        return digest.hexdigest()
+
+
+    def load(self, key: str) -> tuple[np.ndarray, dict] | None:
+        # Se devuelve el volumen mapeado en memoria y sus metadatos
+        with self._lock:
+            entry = self._index['series'].get(key)
+            if entry is None:
+                return None
+            try:
+                with open(self._path(key, '.json')) as f:
+                    meta = json.load(f)
+                volume = np.load(self._path(key, '.npy'), mmap_mode='r')
+            except (OSError, ValueError):
+                self._remove(key)
+                self._save_index()
+                return None
+
+            entry['atime'] = time.time()
+            refs = [r for r in self._mapped.get(key, []) if r() is not None]
+            self._mapped[key] = refs + [weakref.ref(volume)]
+            self._save_index()
+        return volume, meta
+
+
+    def store(self, key: str, fnames: list[str], volume: np.ndarray,
+              meta: dict) -> None:
+        # Los volúmenes que no caben en la caché no se guardan
+        if volume.nbytes > self.max_bytes:
+            return
+
+        # Se escribe a un archivo temporal y luego se renombra, para no
+        # dejar entradas incompletas
+        for ext, write in (
+            ('.npy', lambda f: np.save(f, volume)),
+            ('.json', lambda f: f.write(json.dumps(meta).encode())),
+        ):
+            path = self._path(key, ext)
+            tmp = self._tmp(path)
+            with open(tmp, 'wb') as f:
+                write(f)
+            os.replace(tmp, path)
+
+        with self._lock:
+            # Los archivos recién escritos ya no están pendientes de borrar
+            paths = [self._path(key, ext) for ext in ('.npy', '.json')]
+            pending = [p for p in self._index.get('pending', []) if p not in paths]
+            self._index['pending'] = pending
+            self._index['series'][key] = {
+                'bytes': volume.nbytes,
+                'atime': time.time(),
+                'files': [os.path.abspath(f) for f in fnames],
+            }
+            self._evict()
+            self._save_index()
+
+
+    def _evict(self) -> None:
+        # Se eliminan las series usadas hace más tiempo hasta respetar
+        # el tamaño máximo. Las series abiertas se conservan, y se vuelve
+        # a intentar borrar los archivos que antes no se pudieron borrar
+        self._retry_pending()
+        series = self._index['series']
+        total = sum(entry['bytes'] for entry in series.values())
+        for key in sorted(series, key=lambda k: series[k]['atime']):
+            if total <= self.max_bytes:
+                break
+            if self._in_use(key):
+                continue
+            total -= series[key]['bytes']
+            self._remove(key)
+
+
+    def _in_use(self, key: str) -> bool:
+        return any(ref() is not None for ref in self._mapped.get(key, []))
+
+
+    def _remove(self, key: str) -> None:
+        self._mapped.pop(key, None)
+        entry = self._index['series'].pop(key, None)
+        if entry is not None:
+            for path in entry['files']:
+                self._index['files'].pop(path, None)
+        for ext in ('.npy', '.json'):
+            self._delete(self._path(key, ext))
+
+
+    def _delete(self, path: str) -> None:
+        # Un archivo que sigue abierto en otro proceso no se puede borrar en
+        # Windows: se anota en el índice para borrarlo más adelante
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            pending = self._index.setdefault('pending', [])
+            if path not in pending:
+                pending.append(path)
+
+
+    def _retry_pending(self) -> None:
+        pending = self._index.pop('pending', [])
+        for path in pending:
+            self._delete(path)
+
+
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.directory, key + ext)
+
+
+    @staticmethod
+    def _tmp(path: str) -> str:
+        # Temporal propio de cada proceso e hilo, para que dos escrituras
+        # simultáneas no se pisen antes del renombrado
+        return f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+
+    def _save_index(self) -> None:
+        # Se llama con el cerrojo tomado
+        tmp = self._tmp(self._index_path)
+        with open(tmp, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self._index_path)
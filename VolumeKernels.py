@@ -0,0 +1,223 @@
+# This Python file uses the following encoding: utf-8
+import math
+import os
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from Instrumentation import instrument
+
+# Memoria temporal máxima de cada bloque de cortes; con varios hilos se
+# usan a la vez como mucho workers bloques
+DEFAULT_CHUNK_BYTES = 64 * 1024**2
+# Bloques por hilo como mínimo, para repartir la carga aunque unos
+# bloques tarden más que otros
+CHUNKS_PER_WORKER = 4
+# Desviación típica, en mm, del filtro de reducción de ruido
+DEFAULT_DENOISE_SIGMA = 0.75
+# Radio del núcleo gaussiano, en desviaciones típicas
+GAUSSIAN_TRUNCATE = 3.0
+
+
+def work_dtype(dtype: np.dtype) -> np.dtype:
+    # Tipo en que se calcula: float32 basta para enteros de hasta 16 bits
+    # y para float32; los tipos más anchos se calculan en float64
+    dtype = np.dtype(dtype)
+    if dtype.itemsize <= 2 or dtype == np.float32:
+        return np.dtype(np.float32)
+    return np.dtype(np.float64)
+
+
+def cast(data: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    # Resultado en el tipo del volumen, redondeado si es entero
+    if np.dtype(dtype).kind in 'iu':
+        np.rint(data, out=data)
+    return data.astype(dtype, copy=False)
+
+
+def rescale(data: np.ndarray, slope: float, intercept: float,
+            dtype: np.dtype) -> np.ndarray:
+    # Regresión lineal m * x + b calculada directamente en dtype, sin el
+    # temporal en float64 de la expresión equivalente
+    out = np.multiply(data, slope, dtype=dtype, casting='unsafe')
+    out += intercept
+    return out
+
+
+def linear_weights(n: int, size: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Índices vecinos y peso del segundo para remuestrear n muestras a
+    # size, con los centros de las muestras alineados en los extremos
+    position = (np.arange(size) + 0.5) * n / size - 0.5
+    position = np.clip(position, 0, n - 1)
+    lo = position.astype(np.intp)
+    hi = np.minimum(lo + 1, n - 1)
+    return lo, hi, (position - lo).astype(np.float32)
+
+
+def lerp(a: np.ndarray, b: np.ndarray, w: np.ndarray, axis: int) -> np.ndarray:
+    # a + (b - a) * w con los pesos a lo largo de axis, sobre a en su lugar
+    shape = [1] * a.ndim
+    shape[axis] = -1
+    diff = np.subtract(b, a, dtype=a.dtype)
+    diff *= w.reshape(shape)
+    a += diff
+    return a
+
+
+def gaussian_weights(sigma: float) -> np.ndarray:
+    # Núcleo gaussiano normalizado de radio GAUSSIAN_TRUNCATE * sigma
+    radius = int(GAUSSIAN_TRUNCATE * sigma + 0.5)
+    if sigma <= 0 or radius == 0:
+        return np.ones(1)
+    x = np.arange(-radius, radius + 1)
+    weights = np.exp(-0.5 * (x / sigma) ** 2)
+    return weights / weights.sum()
+
+
+def _window(data: np.ndarray, axis: int, start: int, length: int) -> np.ndarray:
+    index = [slice(None)] * data.ndim
+    index[axis] = slice(start, start + length)
+    return data[tuple(index)]
+
+
+def convolve(padded: np.ndarray, weights: np.ndarray, axis: int) -> np.ndarray:
+    # Convolución con un núcleo simétrico a lo largo de axis sobre datos ya
+    # extendidos por el radio en ambos bordes. Se suman ventanas
+    # desplazadas, emparejando las simétricas para multiplicar la mitad
+    radius = len(weights) // 2
+    n = padded.shape[axis] - 2 * radius
+    out = _window(padded, axis, radius, n) * padded.dtype.type(weights[radius])
+    tmp = np.empty_like(out)
+    for k in range(radius):
+        np.add(_window(padded, axis, k, n), _window(padded, axis, 2 * radius - k, n), out=tmp)
+        tmp *= padded.dtype.type(weights[k])
+        out += tmp
+    return out
+
+
+def pad_edges(data: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    # Se repiten los bordes radius muestras hacia cada lado
+    n = data.shape[axis]
+    return np.take(data, np.clip(np.arange(-radius, n + radius), 0, n - 1), axis)
+
+
+class VolumeKernels:
+    def __init__(self, workers: int | None = None,
+                 chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> None:
+        # Número de hilos, por defecto uno por núcleo. Las operaciones de
+        # NumPy sobre bloques grandes liberan el GIL, así que los hilos
+        # escalan con los núcleos sin copiar el volumen entre procesos
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_bytes = chunk_bytes
+
+
+    def chunks(self, length: int, slice_bytes: int) -> list[tuple[int, int]]:
+        # Bloques de cortes [lo, hi) cuyo temporal, de slice_bytes por corte,
+        # cabe en chunk_bytes; al menos CHUNKS_PER_WORKER bloques por hilo
+        step = max(1, self.chunk_bytes // max(slice_bytes, 1))
+        if self.workers > 1:
+            step = min(step, math.ceil(length / (self.workers * CHUNKS_PER_WORKER)))
+        step = max(step, 1)
+        return [(lo, min(lo + step, length)) for lo in range(0, length, step)]
+
+
+    def map(self, func: Callable[[int, int], object], length: int,
+            slice_bytes: int) -> list:
+        # Se aplica func(lo, hi) a cada bloque de cortes y se devuelven los
+        # resultados en orden. Cada hilo procesa un bloque a la vez, así
+        # que la memoria temporal queda acotada a workers bloques
+        chunks = self.chunks(length, slice_bytes)
+        if self.workers == 1 or len(chunks) == 1:
+            return [func(lo, hi) for lo, hi in chunks]
+        with ThreadPoolExecutor(self.workers) as executor:
+            return list(executor.map(lambda chunk: func(*chunk), chunks))
+
+
+    def rescale(self, volume: np.ndarray, slope: float, intercept: float,
+                dtype: np.dtype = np.float32) -> np.ndarray:
+        # Volumen en unidades reales (m * x + b)
+        dtype = np.dtype(dtype)
+        out = np.empty(volume.shape, dtype)
+
+        def kernel(lo: int, hi: int) -> None:
+            out[lo:hi] = rescale(volume[lo:hi], slope, intercept, dtype)
+
+        with instrument.timer('kernel.rescale'):
+            self.map(kernel, len(volume), volume[0].size * dtype.itemsize)
+        return out
+
+
+    def slice_limits(self, volume: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # Mínimo y máximo de cada corte
+        def kernel(lo: int, hi: int) -> tuple[np.ndarray, np.ndarray]:
+            chunk = volume[lo:hi].reshape(hi - lo, -1)
+            return chunk.min(axis=1), chunk.max(axis=1)
+
+        with instrument.timer('kernel.limits'):
+            limits = self.map(kernel, len(volume), 0)
+        return (np.concatenate([low for low, _ in limits]).astype(np.float64),
+                np.concatenate([high for _, high in limits]).astype(np.float64))
+
+
+    def isotropic(self, volume: np.ndarray, spacing: tuple[float, float, float],
+                  target: float | None = None) -> tuple[np.ndarray, tuple[float, float, float]]:
+        # Remuestreo trilineal a vóxeles cúbicos de lado target (por
+        # defecto la menor separación), conservando la extensión física.
+        # spacing y el resultado siguen el orden del volumen (z, y, x)
+        target = target or min(spacing)
+        shape = tuple(
+            max(round(n * step / target), 1) for n, step in zip(volume.shape, spacing)
+        )
+        spacing = tuple(n * step / size for n, step, size in zip(volume.shape, spacing, shape))
+        weights = [linear_weights(n, size) for n, size in zip(volume.shape, shape)]
+        dtype = work_dtype(volume.dtype)
+        out = np.empty(shape, volume.dtype)
+
+        def kernel(lo: int, hi: int) -> None:
+            # Cada bloque de cortes de salida lee sólo los cortes vecinos
+            # que necesita y se interpola eje por eje; los ejes que ya
+            # tienen la separación pedida se dejan como están
+            z_lo, z_hi, z_w = (a[lo:hi] for a in weights[0])
+            data = lerp(volume[z_lo].astype(dtype), volume[z_hi], z_w, 0)
+            for axis in (1, 2):
+                if shape[axis] != volume.shape[axis]:
+                    index_lo, index_hi, w = weights[axis]
+                    data = lerp(np.take(data, index_lo, axis),
+                                np.take(data, index_hi, axis), w, axis)
+            out[lo:hi] = cast(data, volume.dtype)
+
+        # Temporales por corte de salida: el corte de entrada en dos copias,
+        # y cada paso intermedio con su producto
+        slice_bytes = 3 * dtype.itemsize * max(volume.shape[1], shape[1]) * max(volume.shape[2], shape[2])
+        with instrument.timer('kernel.isotropic'):
+            self.map(kernel, shape[0], slice_bytes)
+        return out, spacing
+
+
+    def denoise(self, volume: np.ndarray, sigma: float = DEFAULT_DENOISE_SIGMA,
+                spacing: tuple[float, float, float] = (1.0, 1.0, 1.0)) -> np.ndarray:
+        # Suavizado gaussiano separable de desviación sigma en mm, convertida
+        # a vóxeles en cada eje. Cada bloque lee además radius cortes de
+        # margen por cada lado (repitiendo los bordes del volumen)
+        weights = [gaussian_weights(sigma / step) for step in spacing]
+        radius = len(weights[0]) // 2
+        n = len(volume)
+        dtype = work_dtype(volume.dtype)
+        out = np.empty_like(volume)
+
+        def kernel(lo: int, hi: int) -> None:
+            index = np.clip(np.arange(lo - radius, hi + radius), 0, n - 1)
+            data = convolve(volume[index].astype(dtype), weights[0], 0)
+            for axis in (1, 2):
+                if len(weights[axis]) > 1:
+                    data = convolve(pad_edges(data, len(weights[axis]) // 2, axis),
+                                    weights[axis], axis)
+            out[lo:hi] = cast(data, volume.dtype)
+
+        # Temporales por corte: el bloque con margen, el acumulador, el
+        # producto y la copia con los bordes extendidos
+        slice_bytes = 4 * dtype.itemsize * volume[0].size
+        with instrument.timer('kernel.denoise'):
+            self.map(kernel, n, slice_bytes)
+        return out
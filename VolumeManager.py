@@ -0,0 +1,104 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from DicomLoader import DicomLoader
+
+# Memoria máxima de todos los volúmenes abiertos y sus estructuras
+# derivadas (copias ordenadas, pirámide, tablas de losas)
+DEFAULT_MEMORY_BUDGET = 4 * 1024**3
+# Estructuras derivadas que se guardan junto a cada volumen
+PARTS = ('reslicer', 'pyramid', 'slabs')
+
+
+def series_key(path: str | list[str]) -> str | tuple[str, ...]:
+    # Un patrón glob o la lista de archivos de la serie
+    return path if isinstance(path, str) else tuple(path)
+
+
+class VolumeManager:
+    def __init__(self, max_bytes: int = DEFAULT_MEMORY_BUDGET) -> None:
+        self.max_bytes = max_bytes
+        # Volúmenes completos por serie, del menos al más reciente. Cada
+        # entrada es un diccionario con 'dcm' y las partes que ya existan
+        self._volumes = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._volumes
+
+
+    def get(self, key) -> dict | None:
+        with self._lock:
+            entry = self._volumes.get(key)
+            if entry is not None:
+                self._volumes.move_to_end(key)
+            return entry
+
+
+    def put(self, key, dcm: DicomLoader, keep: tuple = (),
+            **parts) -> dict | None:
+        # Se añade o actualiza la entrada de una serie, que pasa a ser la
+        # más reciente, y se liberan las menos recientes que no quepan. Las
+        # de keep (ej. la mostrada) no se descartan; la nueva sí, si no cabe
+        # junto a ellas, y entonces se devuelve None
+        with self._lock:
+            entry = self._volumes.pop(key, {})
+            entry['dcm'] = dcm
+            entry.update(parts)
+            self._volumes[key] = entry
+        if key in self.trim(keep):
+            return None
+        return entry
+
+
+    def fits(self, nbytes: int, keep: tuple = ()) -> bool:
+        # Si un volumen de nbytes cabe en el presupuesto junto a los de keep
+        with self._lock:
+            kept = sum(self.nbytes(self._volumes[key]) for key in keep
+                       if key in self._volumes)
+        return kept + nbytes <= self.max_bytes
+
+
+    def trim(self, keep: tuple = ()) -> list:
+        # Se descartan volúmenes, del menos reciente al más reciente, hasta
+        # que todos quepan en el presupuesto. Los de keep (ej. el mostrado)
+        # nunca se descartan
+        evicted = []
+        with self._lock:
+            sizes = {key: self.nbytes(entry) for key, entry in self._volumes.items()}
+            total = sum(sizes.values())
+            for key in list(self._volumes):
+                if total <= self.max_bytes:
+                    break
+                if key in keep:
+                    continue
+                del self._volumes[key]
+                total -= sizes[key]
+                evicted.append(key)
+        return evicted
+
+
+    @staticmethod
+    def nbytes(entry: dict) -> int:
+        total = entry['dcm'].volume.nbytes
+        for name in PARTS:
+            if entry.get(name) is not None:
+                total += entry[name].nbytes()
+        return total
+
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(self.nbytes(entry) for entry in self._volumes.values())
+
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._volumes)
@@ -0,0 +1,99 @@
+# This Python file uses the following encoding: utf-8
+import threading
+
+import numpy as np
+
+# Factores de reducción por eje de cada nivel
+DEFAULT_FACTORS = (2, 4)
+# Memoria máxima de todos los niveles, como fracción del volumen original
+DEFAULT_MAX_OVERHEAD = 0.25
+# Lado mínimo, en píxeles, de un plano de vista previa
+MIN_PREVIEW_SIZE = 96
+# Cortes que se promedian a la vez al construir un nivel
+CHUNK_SLICES = 16
+# Eje del volumen (z, y, x) que recorre cada plano
+AXES = {'axial': 0, 'coronal': 1, 'sagital': 2}
+
+
+class VolumePyramid:
+    def __init__(self, volume: np.ndarray,
+                 factors: tuple[int, ...] = DEFAULT_FACTORS,
+                 max_overhead: float = DEFAULT_MAX_OVERHEAD,
+                 min_preview_size: int = MIN_PREVIEW_SIZE) -> None:
+        self.volume = volume
+        self.max_overhead = max_overhead
+        self.min_preview_size = min_preview_size
+        self.levels = {}
+
+        # Sólo se usan los niveles que caben en la memoria permitida
+        self.factors = []
+        overhead = 0.0
+        for factor in sorted(factors):
+            overhead += 1 / factor**3
+            if overhead > max_overhead:
+                break
+            self.factors.append(factor)
+
+
+    def build(self) -> None:
+        # Los niveles se construyen en segundo plano; hasta entonces las
+        # vistas usan la resolución completa
+        threading.Thread(target=self._build_levels, daemon=True).start()
+
+
+    def _build_levels(self) -> None:
+        # Un nivel con algún eje vacío (ej. una serie con menos cortes que
+        # el factor) no sirve de vista previa; tampoco los más gruesos
+        source, source_factor = self.volume, 1
+        for factor in self.factors:
+            if min(self.volume.shape) < factor:
+                break
+            level = self._downsample(source, factor // source_factor)
+            self.levels[factor] = level
+            source, source_factor = level, factor
+
+
+    def nbytes(self) -> int:
+        return sum(level.nbytes for level in self.levels.values())
+
+
+    @staticmethod
+    def _downsample(volume: np.ndarray, factor: int) -> np.ndarray:
+        # Promedio de bloques factor³, por grupos de cortes para acotar la
+        # memoria temporal
+        z, y, x = (n // factor for n in volume.shape)
+        out = np.empty((z, y, x), volume.dtype)
+        step = CHUNK_SLICES
+        for start in range(0, z, step):
+            stop = min(start + step, z)
+            block = volume[start * factor:stop * factor, :y * factor, :x * factor]
+            block = block.reshape(stop - start, factor, y, factor, x, factor)
+            mean = block.mean(axis=(1, 3, 5))
+            if out.dtype.kind in 'iu':
+                mean = np.rint(mean)
+            out[start:stop] = mean
+        return out
+
+
+    def preview_factor(self, plane: str) -> int | None:
+        # Nivel más grueso ya construido cuyo plano conserva un tamaño útil
+        z, y, x = self.volume.shape
+        size = {'axial': min(y, x), 'sagital': min(z, y), 'coronal': min(z, x)}[plane]
+        for factor in sorted(self.levels, reverse=True):
+            if size // factor >= self.min_preview_size:
+                return factor
+        return None
+
+
+    def plane(self, factor: int, plane: str, slice_index: int) -> np.ndarray:
+        # Plano del nivel reducido que contiene el corte slice_index del
+        # volumen original
+        level = self.levels[factor]
+        index = min(slice_index // factor, level.shape[AXES[plane]] - 1)
+        match plane:
+            case 'axial':
+                return level[index]
+            case 'sagital':
+                return level[:, :, index]
+            case 'coronal':
+                return level[:, index, :]
@@ -0,0 +1,81 @@
+# This Python file uses the following encoding: utf-8
+import threading
+
+import numpy as np
+
+# Número de intervalos del histograma de volúmenes en coma flotante
+FLOAT_BINS = 4096
+
+
+class VolumeStats:
+    def __init__(self, dtype: np.dtype, slope: float = 1.0,
+                 intercept: float = 0.0,
+                 value_range: tuple[float, float] | None = None) -> None:
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.Lock()
+
+        # Los enteros de 8 y 16 bits tienen un intervalo por cada valor
+        # posible, indexado por su representación sin signo; los demás
+        # tipos usan intervalos fijos sobre el rango que permite la cabecera
+        if self.dtype.kind in 'iu' and self.dtype.itemsize <= 2:
+            index = np.arange(2 ** (8 * self.dtype.itemsize))
+            self._index_dtype = np.dtype(f'u{self.dtype.itemsize}')
+            stored = index.astype(self._index_dtype).view(self.dtype)
+            self.values = slope * stored.astype(np.float64) + intercept
+            self._edges = None
+        else:
+            self._index_dtype = None
+            edges = np.linspace(*value_range, FLOAT_BINS + 1)
+            self.values = (edges[:-1] + edges[1:]) / 2
+            # Los límites se pasan a valores guardados, para no aplicar la
+            # regresión a cada corte (ej. enteros de 32 bits sin convertir)
+            self._edges = (edges - intercept) / slope
+            if slope < 0:
+                self._edges = self._edges[::-1]
+                self.values = self.values[::-1]
+        self.counts = np.zeros(len(self.values), np.int64)
+
+
+    def add(self, data: np.ndarray) -> None:
+        # Histograma de un corte, sumado al del volumen. Se puede llamar
+        # desde varios hilos a la vez
+        if self._edges is None:
+            counts = np.bincount(
+                data.view(self._index_dtype).ravel(), minlength=len(self.counts)
+            )
+        else:
+            counts, _ = np.histogram(data, self._edges)
+        with self._lock:
+            self.counts += counts
+
+
+    def percentile(self, q: float) -> float:
+        # Valor por debajo del cual queda el q % de los vóxeles
+        order = np.argsort(self.values, kind='stable')
+        cumulative = np.cumsum(self.counts[order])
+        if not cumulative[-1]:
+            return 0.0
+        position = np.searchsorted(cumulative, q / 100 * cumulative[-1])
+        return float(self.values[order][min(position, len(order) - 1)])
+
+
+    def histogram(self, vmin: float, vmax: float,
+                  bins: int = 256) -> tuple[np.ndarray, np.ndarray]:
+        # Histograma agrupado en bins intervalos entre vmin y vmax, para
+        # mostrarlo en la interfaz
+        mask = self.counts > 0
+        return np.histogram(
+            self.values[mask], bins, (vmin, vmax), weights=self.counts[mask]
+        )
+
+
+    def to_sparse(self) -> list[list[int]]:
+        # Sólo los intervalos no vacíos, para guardarlos en la caché
+        nonzero = np.flatnonzero(self.counts)
+        return np.stack([nonzero, self.counts[nonzero]], axis=1).tolist()
+
+
+    def load_sparse(self, sparse: list[list[int]]) -> None:
+        if sparse:
+            index, counts = np.array(sparse, np.int64).T
+            self.counts[index] = counts
@@ -0,0 +1,81 @@
+# This Python file uses the following encoding: utf-8
+from collections import OrderedDict
+
+import numpy as np
+
+from Instrumentation import instrument
+
+# Ventanas habituales de TC como (centro, ancho), en unidades Hounsfield
+PRESETS = {
+    'Pulmón': (-600, 1500),
+    'Mediastino': (50, 350),
+    'Abdomen': (40, 400),
+    'Hueso': (400, 1800),
+    'Cerebro': (40, 80),
+}
+
+# Número de tablas que se conservan para volver a ventanas recientes
+# sin recalcularlas
+MAX_TABLES = 16
+
+
+def window_limits(center: float, width: float) -> tuple[float, float]:
+    # Límites inferior y superior de una ventana (centro, ancho)
+    return center - width / 2, center + width / 2
+
+
+class WindowLUT:
+    def __init__(self, dtype: np.dtype, slope: float = 1.0,
+                 intercept: float = 0.0) -> None:
+        self.dtype = np.dtype(dtype)
+        self.slope = slope
+        self.intercept = intercept
+        self.window = None
+        self.table = None
+        self._tables = OrderedDict()
+
+        # Los enteros de 8 y 16 bits se convierten con una tabla indexada
+        # por su representación sin signo, que cubre todos los valores
+        # posibles; el resto se convierte aritméticamente
+        if self.dtype.kind in 'iu' and self.dtype.itemsize <= 2:
+            index = np.arange(2 ** (8 * self.dtype.itemsize))
+            self._index_dtype = np.dtype(f'u{self.dtype.itemsize}')
+            stored = index.astype(self._index_dtype).view(self.dtype)
+            self._values = self.slope * stored.astype(np.float64) + self.intercept
+        else:
+            self._index_dtype = None
+            self._values = None
+
+
+    def set_window(self, vmin: float, vmax: float) -> None:
+        # La tabla de cada par (min, max) se calcula una sola vez
+        window = (float(vmin), float(vmax))
+        if window == self.window:
+            return
+        self.window = window
+        if self._values is None:
+            return
+
+        if window in self._tables:
+            self._tables.move_to_end(window)
+        else:
+            self._tables[window] = self._scale(self._values)
+            if len(self._tables) > MAX_TABLES:
+                self._tables.popitem(last=False)
+        self.table = self._tables[window]
+
+
+    def _scale(self, values: np.ndarray) -> np.ndarray:
+        # Conversión lineal de [min, max] a [0, 255]
+        vmin, vmax = self.window
+        width = max(vmax - vmin, 1e-6)
+        scaled = (values - vmin) * (255 / width)
+        return np.clip(scaled, 0, 255).astype(np.uint8)
+
+
+    def apply(self, raw: np.ndarray) -> np.ndarray:
+        # Valores guardados del volumen a valores de pantalla uint8
+        with instrument.timer('window'):
+            if self.table is None:
+                return self._scale(self.slope * raw + self.intercept)
+            return np.take(self.table, raw.view(self._index_dtype))
@@ -0,0 +1,424 @@
+# This Python file uses the following encoding: utf-8
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+# Sin pantalla: Qt usa la plataforma offscreen
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np
+import pydicom
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.encaps import encapsulate
+from pydicom.uid import (
+    CTImageStorage, ExplicitVRLittleEndian, JPEG2000Lossless, RLELossless,
+    generate_uid
+)
+
+# Arranque del visor en un intérprete nuevo: importación de mainwindow,
+# ventana visible y, después, importación de los módulos DICOM
+STARTUP_SCRIPT = '''
+import sys, json, time
+start = time.perf_counter()
+import mainwindow
+imported = time.perf_counter()
+from PySide2.QtWidgets import QApplication
+app = QApplication(sys.argv)
+window = mainwindow.MainWindow()
+window.show()
+app.processEvents()
+shown = time.perf_counter()
+mainwindow.preload_dicom_modules()
+print(json.dumps({
+    'import': imported - start,
+    'window': shown - start,
+    'dicom_modules': time.perf_counter() - shown,
+}))
+'''
+
+
+def generate_series(directory: str, slices: int, rows: int = 512,
+                    cols: int = 512, bits: int = 16, signed: bool = True,
+                    seed: int = 0, syntax: str = 'raw') -> list[str]:
+    # Serie sintética de TC con un corte por archivo, sin comprimir o
+    # comprimida sin pérdida (JPEG 2000 con Pillow, RLE con pydicom)
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    dtype = np.dtype(f"{'i' if signed else 'u'}{bits // 8}")
+    high = min(np.iinfo(dtype).max, 3000)
+    low = max(np.iinfo(dtype).min, -1024)
+    base = rng.integers(low, high, size=(rows, cols), dtype=dtype)
+    study, series = generate_uid(), generate_uid()
+
+    fnames = []
+    for i in range(slices):
+        meta = FileMetaDataset()
+        meta.MediaStorageSOPClassUID = CTImageStorage
+        meta.MediaStorageSOPInstanceUID = generate_uid()
+        meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+        ds = Dataset()
+        ds.file_meta = meta
+        ds.SOPClassUID = CTImageStorage
+        ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+        ds.StudyInstanceUID = study
+        ds.SeriesInstanceUID = series
+        ds.PatientName = 'Sintetico^Paciente'
+        ds.PatientID = 'BENCH'
+        ds.Modality = 'CT'
+        ds.InstanceNumber = i + 1
+        ds.SliceLocation = float(i)
+        ds.ImagePositionPatient = [0.0, 0.0, float(i)]
+        ds.SliceThickness = 1.0
+        ds.PixelSpacing = [0.7, 0.7]
+        ds.Rows, ds.Columns = rows, cols
+        ds.SamplesPerPixel = 1
+        ds.PhotometricInterpretation = 'MONOCHROME2'
+        ds.BitsAllocated = bits
+        ds.BitsStored = bits
+        ds.HighBit = bits - 1
+        ds.PixelRepresentation = int(signed)
+        ds.RescaleSlope = 1
+        ds.RescaleIntercept = 0 if signed else -1024
+        ds.WindowCenter = 40
+        ds.WindowWidth = 400
+        ds.PixelData = np.roll(base, i, axis=0).tobytes()
+
+        ds.is_little_endian = True
+        ds.is_implicit_VR = False
+        match syntax:
+            case 'jpeg2000':
+                ds.PixelData = encapsulate([_jpeg2000(np.roll(base, i, axis=0))])
+                ds['PixelData'].VR = 'OB'
+                meta.TransferSyntaxUID = JPEG2000Lossless
+            case 'rle':
+                ds.compress(RLELossless)
+
+        fname = os.path.join(directory, f'IM{i:05d}.dcm')
+        ds.save_as(fname, write_like_original=False)
+        fnames.append(fname)
+    return fnames
+
+
+def _jpeg2000(data: np.ndarray) -> bytes:
+    # Codificación JPEG 2000 sin pérdida de un corte, con Pillow
+    from PIL import Image
+    unsigned = data.view(f'u{data.dtype.itemsize}')
+    mode = 'L' if data.dtype.itemsize == 1 else 'I;16'
+    image = Image.frombytes(mode, unsigned.shape[::-1], unsigned.tobytes())
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG2000', irreversible=False, no_jp2=True)
+    return buffer.getvalue()
+
+
+class Benchmark:
+    def __init__(self, repeat: int) -> None:
+        self.repeat = repeat
+        self.results = {}
+        self.codecs = {}
+        self.scaling = {}
+
+
+    def measure(self, name: str, func, repeat: int | None = None) -> None:
+        # Tiempo de cada repetición y memoria pico asignada durante ellas
+        times = []
+        tracemalloc.start()
+        for _ in range(repeat or self.repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.record(name, times, peak)
+
+
+    def record(self, name: str, times: list[float], peak: int = 0) -> None:
+        self.results[name] = {
+            'runs': len(times),
+            'mean': float(np.mean(times)),
+            'min': float(np.min(times)),
+            'max': float(np.max(times)),
+            'peak_bytes': peak,
+        }
+        print(f'{name:40s} {1000 * np.mean(times):10.2f} ms '
+              f'{peak / 1024**2:10.1f} MB')
+
+
+def bench_loader(bench: Benchmark, series: str, workdir: str,
+                 workers: int | None) -> None:
+    from DicomLoader import DicomLoader
+    from VolumeCache import VolumeCache
+    from Reslicer import Reslicer
+    from SlabEngine import SlabEngine
+
+    path = os.path.join(series, '*')
+    bench.measure(
+        'loader.construct',
+        lambda: DicomLoader(path, workers=workers)
+    )
+
+    # Tiempo de decodificación por códec de una carga completa
+    bench.codecs = DicomLoader(path, workers=workers).decoder.timing()
+    for name, timing in bench.codecs.items():
+        print(f'{"codec." + name:40s} {timing["ms_per_frame"]:10.2f} ms/frame '
+              f'{timing["frames"]:7d} frames')
+
+    cache = VolumeCache(os.path.join(workdir, 'cache'))
+    DicomLoader(path, workers=workers, cache=cache)
+    bench.measure(
+        'loader.construct_cached',
+        lambda: DicomLoader(path, workers=workers, cache=cache)
+    )
+
+    # Modo perezoso: primer corte axial y recorrido con lectura adelantada
+    bench.measure(
+        'lazy.first_axial',
+        lambda: DicomLoader(path, workers=workers, lazy=True).plane('axial', 0)
+    )
+    lazy = DicomLoader(path, workers=workers, lazy=True)
+    bench.measure(
+        'lazy.scroll_axial',
+        lambda: [lazy.plane('axial', i) for i in range(len(lazy.frames))],
+        repeat=1
+    )
+
+    dcm = DicomLoader(path, workers=workers)
+    y, x, z = dcm.shape
+    for plane, n in (('axial', z), ('sagital', x), ('coronal', y)):
+        indices = range(0, n, max(n // 32, 1))
+        bench.measure(
+            f'plane.{plane}',
+            lambda: [dcm.plane(plane, i) for i in indices]
+        )
+        bench.measure(
+            f'raw_plane.{plane}',
+            lambda: [np.ascontiguousarray(dcm.raw_plane(plane, i)) for i in indices]
+        )
+
+    reslicer = Reslicer(dcm, cache_size=0)
+    reslicer._build_copies()
+    for plane, n in (('axial', z), ('sagital', x), ('coronal', y)):
+        indices = range(0, n, max(n // 32, 1))
+        bench.measure(
+            f'reslice.{plane}',
+            lambda: [reslicer.plane(plane, i) for i in indices]
+        )
+
+    # Proyecciones de losa: construcción de las tablas de cada modo y
+    # losas finas y gruesas en los tres planos
+    for mode in ('max', 'mean'):
+        slabs = SlabEngine(dcm.volume)
+        slabs.mode = mode
+        bench.measure(f'slab.build.{mode}', lambda: slabs._build(mode), repeat=1)
+        for plane, n in (('axial', z), ('sagital', x), ('coronal', y)):
+            indices = range(0, n, max(n // 32, 1))
+            for thickness in (8, 64):
+                bench.measure(
+                    f'slab.{mode}.{plane}.{thickness}',
+                    lambda: [slabs.slab(mode, plane, i, thickness) for i in indices]
+                )
+
+    bench.measure('volume.minmax', lambda: (dcm.volume.min(), dcm.volume.max()))
+
+
+def bench_kernels(bench: Benchmark, series: str) -> None:
+    # Operaciones por bloques sobre el volumen completo con 1, 2, 4... hilos
+    # hasta los núcleos disponibles. La aceleración respecto a un hilo se
+    # guarda aparte; la memoria pico muestra el temporal acotado
+    from DicomLoader import DicomLoader
+    from VolumeKernels import VolumeKernels
+
+    dcm = DicomLoader(os.path.join(series, '*'))
+    spacing = (dcm.st, *dcm.ps)
+    cpus = os.cpu_count() or 1
+    counts = sorted({2 ** i for i in range(cpus.bit_length()) if 2 ** i <= cpus} | {cpus})
+    operations = {
+        'rescale': lambda k: k.rescale(dcm.volume, dcm.slope, dcm.intercept),
+        'limits': lambda k: k.slice_limits(dcm.volume),
+        'isotropic': lambda k: k.isotropic(dcm.volume, spacing),
+        'denoise': lambda k: k.denoise(dcm.volume, spacing=spacing),
+    }
+    for name, operation in operations.items():
+        for workers in counts:
+            kernels = VolumeKernels(workers)
+            bench.measure(f'kernels.{name}.{workers}', lambda: operation(kernels))
+        base = bench.results[f'kernels.{name}.1']['mean']
+        bench.scaling[name] = {
+            workers: base / bench.results[f'kernels.{name}.{workers}']['mean']
+            for workers in counts
+        }
+        print(f'{"kernels." + name + ".speedup":40s} ' + ' '.join(
+            f'{workers}:{speedup:.2f}x' for workers, speedup in bench.scaling[name].items()
+        ))
+
+
+def bench_startup(bench: Benchmark) -> None:
+    # Cada arranque en un proceso nuevo, para no reutilizar los módulos
+    # ya importados. startup.process incluye el arranque del intérprete
+    times = {'process': [], 'import': [], 'window': [], 'dicom_modules': []}
+    for _ in range(bench.repeat):
+        start = time.perf_counter()
+        output = subprocess.check_output(
+            [sys.executable, '-c', STARTUP_SCRIPT],
+            cwd=os.path.dirname(os.path.abspath(__file__)), text=True
+        )
+        times['process'].append(time.perf_counter() - start)
+        for name, seconds in json.loads(output.splitlines()[-1]).items():
+            times[name].append(seconds)
+    for name, values in times.items():
+        bench.record(f'startup.{name}', values)
+
+
+def bench_gui(bench: Benchmark, series: str, workdir: str) -> None:
+    from PySide2.QtWidgets import QApplication
+    import mainwindow
+    from VolumeCache import VolumeCache
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    mainwindow.QMessageBox.information = lambda *args, **kwargs: None
+
+    window = mainwindow.MainWindow()
+    window.cache = VolumeCache(os.path.join(workdir, 'gui-cache'))
+    window.show()
+    app.processEvents()
+
+    # Carga completa en segundo plano, hasta el último corte
+    def load() -> None:
+        window._load_planes(os.path.join(series, '*'))
+        while window.worker is not None:
+            app.processEvents()
+            time.sleep(0.001)
+        window.scheduler.flush()
+    bench.measure('gui.load', load, repeat=1)
+
+    y, x, z = window.dcm.shape
+    for plane, n in (('axial', z), ('sagital', x), ('coronal', y)):
+        indices = range(0, n, max(n // 32, 1))
+        bench.measure(
+            f'gui.draw_plane.{plane}',
+            lambda: [window._draw_plane(plane, i) for i in indices]
+        )
+
+    def update_spectrum() -> None:
+        for step in range(16):
+            window.ui.minDoubleSpinBox.setValue(window.dcm.min + step)
+            window.update_spectrum()
+            window.scheduler.flush()
+    bench.measure('gui.update_spectrum', update_spectrum)
+    window.close()
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def max_rss_bytes(bench: Benchmark) -> int:
+    # Memoria residente máxima del proceso. Sin resource (Windows) se usa
+    # psutil si está instalado y, si no, el mayor pico de tracemalloc
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss está en KiB en Linux y en bytes en macOS
+        return rss if sys.platform == 'darwin' else rss * 1024
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+    except (ImportError, AttributeError):
+        return max((r['peak_bytes'] for r in bench.results.values()), default=0)
+
+
+def compare(results: dict, previous: dict) -> None:
+    # Razón entre el tiempo medio actual y el de la referencia
+    print(f'\n{"comparación":40s} {"actual/ref":>13s}')
+    for name, result in results.items():
+        if name in previous:
+            ratio = result['mean'] / previous[name]['mean']
+            print(f'{name:40s} {ratio:12.2f}x')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Benchmarks de carga, corte y dibujo sin pantalla'
+    )
+    parser.add_argument('--slices', type=int, default=200)
+    parser.add_argument('--rows', type=int, default=512)
+    parser.add_argument('--cols', type=int, default=512)
+    parser.add_argument('--bits', type=int, default=16, choices=(8, 16))
+    parser.add_argument('--unsigned', action='store_true')
+    parser.add_argument('--syntax', default='raw',
+                        choices=('raw', 'jpeg2000', 'rle'))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--workdir', default=None,
+                        help='directorio de la serie sintética (se conserva)')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', default=None,
+                        help='JSON de una ejecución anterior')
+    parser.add_argument('--no-gui', action='store_true')
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='qdicom-bench-')
+    series = os.path.join(
+        workdir,
+        f'series-{args.slices}x{args.rows}x{args.cols}-{args.bits}'
+        f'{"u" if args.unsigned else "s"}-{args.syntax}'
+    )
+    if not os.path.isdir(series):
+        generate_series(series, args.slices, args.rows, args.cols,
+                        args.bits, not args.unsigned, syntax=args.syntax)
+
+    bench = Benchmark(args.repeat)
+    try:
+        if not args.no_gui:
+            bench_startup(bench)
+        bench_loader(bench, series, workdir, args.workers)
+        bench_kernels(bench, series)
+        if not args.no_gui:
+            bench_gui(bench, series, workdir)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pydicom': pydicom.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'args': vars(args),
+        'max_rss_bytes': max_rss_bytes(bench),
+        'results': bench.results,
+        'codecs': bench.codecs,
+        'scaling': bench.scaling,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(bench.results, json.load(f)['results'])
+
+
+if __name__ == '__main__':
+    main()
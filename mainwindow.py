@@ -1,16 +1,32 @@
 # This Python file uses the following encoding: utf-8
+from __future__ import annotations
+
+import os
 import sys
+import threading
+import importlib
+from functools import partial
+from typing import TYPE_CHECKING
+
+import numpy as np
 
-from PySide2.QtCore import Slot
+from PySide2.QtCore import Slot, QThreadPool, QTimer
+from PySide2.QtGui import QCloseEvent
 from PySide2.QtWidgets import (
-    QApplication, QMainWindow, QGraphicsScene, QFileDialog, QMessageBox
+    QApplication, QMainWindow, QFileDialog, QMessageBox, QProgressBar,
+    QPushButton
 )
 
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-import matplotlib.pyplot as plt
-
-from DicomLoader import DicomLoader, InvalidDICOM, DICOMNotFound
+from PlaneRenderer import PlaneRenderer
+from RenderScheduler import RenderScheduler, FRAME_INTERVAL
+from VolumePyramid import (
+    VolumePyramid, DEFAULT_FACTORS, DEFAULT_MAX_OVERHEAD, MIN_PREVIEW_SIZE
+)
+from SlabEngine import SlabEngine
+from VolumeManager import VolumeManager, series_key
+from WindowLUT import WindowLUT, PRESETS, window_limits
+from Instrumentation import instrument, TRACE_PATH
+from PerformanceHUD import PerformanceHUD
 
 # Important:
 # You need to run the following command to generate the ui_form.py file
@@ -18,8 +34,38 @@ from DicomLoader import DicomLoader, InvalidDICOM, DICOMNotFound
 #     pyside2-uic form.ui -o ui_form.py
 from ui_form import Ui_MainWindow
 
+if TYPE_CHECKING:
+    from DicomLoader import DicomLoader
+    from LoadWorker import LoadWorker, ProcessWorker, ScanWorker
+
+# Espera, en ms, desde el último dibujo de una vista previa hasta que se
+# dibuja el plano en resolución completa
+REFINE_DELAY = 150
+# Percentiles de la ventana automática
+AUTO_PERCENTILES = (1, 99)
+# Intervalos del histograma mostrado junto a los límites espectrales
+HISTOGRAM_BINS = 256
+# Modo de SlabEngine de cada opción del selector de proyección; None
+# muestra el corte sin proyectar
+SLAB_MODES = (None, 'max', 'min', 'mean')
+# Espera máxima, en ms, a que termine la carga por adelantado al cerrar
+PREFETCH_CLOSE_TIMEOUT = 2000
+# Módulos que importan pydicom: no se importan al arrancar, sino en segundo
+# plano con la ventana ya visible, o al abrir la primera carpeta
+DICOM_MODULES = ('DicomLoader', 'DicomScanner', 'LoadWorker', 'VolumeCache', 'Reslicer')
+
+
+def preload_dicom_modules() -> None:
+    for name in DICOM_MODULES:
+        importlib.import_module(name)
+
+
 class MainWindow(QMainWindow):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, refine_delay: int = REFINE_DELAY,
+                 frame_interval: int = FRAME_INTERVAL,
+                 pyramid_factors: tuple[int, ...] = DEFAULT_FACTORS,
+                 pyramid_overhead: float = DEFAULT_MAX_OVERHEAD,
+                 min_preview_size: int = MIN_PREVIEW_SIZE):
         super().__init__(parent)
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
@@ -28,6 +74,120 @@ class MainWindow(QMainWindow):
         self.ui.actionCarpeta.triggered.connect(self.open_folder)
         self.ui.actionSalir.triggered.connect(self.close)
 
+        # Caché en disco de los volúmenes ya abiertos e índice de las
+        # series encontradas en cada carpeta; se crean al usarse por
+        # primera vez
+        self.cache = None
+        self.scanner = None
+
+        # Volúmenes ya abiertos, bajo un presupuesto de memoria, y series de
+        # la última carpeta. La serie siguiente a la mostrada se carga por
+        # adelantado en un pool propio, para no retrasar la carga principal
+        self.volumes = VolumeManager()
+        self.series = []
+        self.series_index = None
+        self.key = None
+        self.prefetcher = None
+        self._pending = None
+        self.prefetch_pool = QThreadPool(self)
+        self.prefetch_pool.setMaxThreadCount(1)
+        self.ui.seriesListWidget.currentRowChanged.connect(self.open_series)
+
+        # Una superficie de dibujo persistente por cada vista
+        self.renderers = {
+            'axial': PlaneRenderer(self.ui.axialView),
+            'sagital': PlaneRenderer(self.ui.sagitalView),
+            'coronal': PlaneRenderer(self.ui.coronalView),
+        }
+
+        self.sliders = {
+            'axial': self.ui.axialSlider,
+            'sagital': self.ui.sagitalSlider,
+            'coronal': self.ui.coronalSlider,
+        }
+
+        self.spin_boxes = {
+            'axial': self.ui.axialSpinBox,
+            'sagital': self.ui.sagitalSpinBox,
+            'coronal': self.ui.coronalSpinBox,
+        }
+
+        # Lo último que se pintó en cada vista: (clave del plano, datos
+        # guardados, tamaño, ventana). Permite no repintar una vista cuyo
+        # corte no cambió, y reaplicar sólo la ventana cuando cambia ésta
+        self._displayed = {}
+
+        # Navegación enlazada: pulsar o arrastrar en una vista mueve el
+        # corte de las otras dos. Mientras se arrastra se usan vistas previas
+        self._dragging = False
+        for plane, renderer in self.renderers.items():
+            renderer.picked.connect(partial(self.pick, plane))
+            renderer.released.connect(self._end_drag)
+            self.ui.actionCruz.toggled.connect(renderer.set_crosshair_visible)
+
+        # Mientras se arrastra un slider se dibuja una vista previa de
+        # menor resolución, que se refina al detenerse
+        self.pyramid = None
+        self.pyramid_options = {
+            'factors': pyramid_factors,
+            'max_overhead': pyramid_overhead,
+            'min_preview_size': min_preview_size,
+        }
+        self._coarse = {}
+        self.refine_timer = QTimer(self)
+        self.refine_timer.setSingleShot(True)
+        self.refine_timer.setInterval(refine_delay)
+        self.refine_timer.timeout.connect(self._refine)
+
+        # Proyecciones de losa gruesa, disponibles con el volumen completo
+        self.slabs = None
+
+        # Volumen procesado (remuestreado o filtrado) de la serie abierta,
+        # calculado en segundo plano a partir del original
+        self.base = None
+        self.base_key = None
+        self.processor = None
+        self.ui.actionIsotropico.toggled.connect(self.update_processing)
+        self.ui.actionReducirRuido.toggled.connect(self.update_processing)
+
+        # Los dibujos se agrupan y se hacen como mucho una vez por cuadro
+        self.scheduler = RenderScheduler(self._draw_plane, self._set_window,
+                                         frame_interval, parent=self)
+
+        # Los controles se conectan una sola vez, no en cada carga
+        self.__connect_ui_components()
+
+        # Preajustes de la ventana espectral
+        self.ui.presetComboBox.activated.connect(self.apply_preset)
+
+        # Progreso y cancelación de la carga en segundo plano
+        self.worker = None
+        self.progress_bar = QProgressBar()
+        self.cancel_button = QPushButton('Cancelar')
+        self.cancel_button.clicked.connect(self.cancel_load)
+        self.ui.statusbar.addPermanentWidget(self.progress_bar)
+        self.ui.statusbar.addPermanentWidget(self.cancel_button)
+        self.__show_progress(False)
+
+        # HUD de rendimiento sobre las vistas y exportación de trazas
+        self.hud = PerformanceHUD(instrument, self.ui.centralwidget)
+        self.ui.actionRendimiento.toggled.connect(self.hud.set_active)
+        self.ui.actionExportarTraza.triggered.connect(self.export_trace)
+
+        # Con el bucle de eventos en marcha (la ventana ya visible) se
+        # importa la pila DICOM en segundo plano
+        QTimer.singleShot(0, self.__preload)
+
+
+    def __preload(self) -> None:
+        threading.Thread(target=preload_dicom_modules, daemon=True).start()
+
+
+    def __show_progress(self, visible: bool) -> None:
+        self.progress_bar.setVisible(visible)
+        self.cancel_button.setVisible(visible)
+        self.progress_bar.setValue(0)
+
 
     def __enable_inputs(self) -> None:
         # Se habilitan los sliders después de cargar las imágenes
@@ -43,6 +203,11 @@ class MainWindow(QMainWindow):
         # Se habilitan los float spinbox después de cargar las imágenes
         self.ui.minDoubleSpinBox.setEnabled(True)
         self.ui.maxDoubleSpinBox.setEnabled(True)
+        self.ui.presetComboBox.setEnabled(True)
+
+        # Se habilitan los controles de proyección
+        self.ui.slabModeComboBox.setEnabled(True)
+        self.ui.slabDoubleSpinBox.setEnabled(True)
 
 
     def __set_spectrum_limits(self) -> None:
@@ -55,6 +220,33 @@ class MainWindow(QMainWindow):
         self.ui.minDoubleSpinBox.setValue(self.dcm.min)
         self.ui.maxDoubleSpinBox.setValue(self.dcm.max)
 
+        # Preajustes: rango completo, ventanas de la cabecera y ventanas
+        # habituales de TC
+        combo = self.ui.presetComboBox
+        combo.clear()
+        combo.addItem('Completo', (self.dcm.min, self.dcm.max))
+        if self.dcm.stats.counts.any():
+            combo.addItem('Automático (p1–p99)', (
+                self.dcm.stats.percentile(AUTO_PERCENTILES[0]),
+                self.dcm.stats.percentile(AUTO_PERCENTILES[1]),
+            ))
+        for center, width in self.dcm.windows:
+            combo.addItem(
+                f'DICOM ({center:g}/{width:g})', window_limits(center, width)
+            )
+        for name, (center, width) in PRESETS.items():
+            combo.addItem(name, window_limits(center, width))
+
+
+    def __update_histogram(self) -> None:
+        # Histograma de los cortes leídos hasta ahora, sobre el rango
+        # espectral del volumen
+        counts, _ = self.dcm.stats.histogram(
+            self.dcm.min, self.dcm.max, HISTOGRAM_BINS
+        )
+        self.ui.histogramWidget.set_histogram(counts, self.dcm.min, self.dcm.max)
+        self.ui.histogramWidget.set_window(self.min_spectrum, self.max_spectrum)
+
 
     def __set_plane_limits(self) -> None:
         # Límites para cada plano
@@ -71,7 +263,8 @@ class MainWindow(QMainWindow):
 
 
     def __connect_ui_components(self) -> None:
-        # Se conectan los slider a los spinbox de los planos
+        # Se conectan los slider a los spinbox de los planos; update_plane
+        # sincroniza el slider cuando cambia el spinbox
         self.ui.axialSlider.valueChanged.connect(self.ui.axialSpinBox.setValue)
         self.ui.sagitalSlider.valueChanged.connect(self.ui.sagitalSpinBox.setValue)
         self.ui.coronalSlider.valueChanged.connect(self.ui.coronalSpinBox.setValue)
@@ -91,80 +284,478 @@ class MainWindow(QMainWindow):
         self.ui.minDoubleSpinBox.valueChanged.connect(self.update_spectrum)
         self.ui.maxDoubleSpinBox.valueChanged.connect(self.update_spectrum)
 
+        # Se conectan el modo y el grosor de la losa
+        self.ui.slabModeComboBox.currentIndexChanged.connect(self.update_slab)
+        self.ui.slabDoubleSpinBox.valueChanged.connect(self.update_slab)
+
+
+    def _scan_folder(self, path: str) -> None:
+        # Se busca en segundo plano las series DICOM de la carpeta y sus
+        # subcarpetas
+        from DicomScanner import DicomScanner
+        from LoadWorker import ScanWorker
+        self.cancel_load()
+        if self.scanner is None:
+            self.scanner = DicomScanner()
+        worker = ScanWorker(self.scanner, path)
+        worker.signals.progress.connect(partial(self._on_scan_progress, worker))
+        worker.signals.finished.connect(partial(self._on_scanned, worker))
+        worker.signals.failed.connect(partial(self._on_failed, worker))
+        self.worker = worker
+        self.__show_progress(True)
+        self.ui.statusbar.showMessage('Buscando archivos DICOM...')
+        QThreadPool.globalInstance().start(worker)
+
+
+    def _on_scan_progress(self, worker: ScanWorker, done: int, total: int) -> None:
+        if worker is not self.worker:
+            return
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
 
-    def _load_planes(self, path: str) -> None:
-        print('load_planes')
-        # Se cargan las imágenes DICOM
-        try:
-            self.dcm = DicomLoader(path)
-        except (InvalidDICOM, DICOMNotFound) as e:
-            QMessageBox.critical(self, 'Error', f'{str(e)}')
+
+    def _on_scanned(self, worker: ScanWorker, series: list[dict]) -> None:
+        from DicomLoader import DICOMNotFound
+        from DicomScanner import series_label
+        if worker is not self.worker:
+            return
+        self.worker = None
+        self.__show_progress(False)
+        self.ui.statusbar.clearMessage()
+        if not series:
+            QMessageBox.critical(self, 'Error', str(DICOMNotFound()))
+            return
+
+        # Se listan las series encontradas y se abre la primera
+        self.__cancel_prefetch()
+        self.series = series
+        self.series_index = None
+        list_widget = self.ui.seriesListWidget
+        list_widget.blockSignals(True)
+        list_widget.clear()
+        list_widget.addItems(
+            [f'{i + 1}. {series_label(s)}' for i, s in enumerate(series)]
+        )
+        list_widget.blockSignals(False)
+        list_widget.setCurrentRow(0)
+
+
+    def _load_planes(self, path: str | list[str]) -> None:
+        from LoadWorker import LoadWorker
+        from VolumeCache import VolumeCache
+        # Se cancela la carga anterior, si sigue en curso
+        self.cancel_load()
+        if self.cache is None:
+            self.cache = VolumeCache()
+
+        # Una serie ya abierta o cargada por adelantado se muestra sin
+        # volver a cargarla; si se está cargando por adelantado, al terminar
+        key = series_key(path)
+        self.__reset_processing(key)
+        entry = self.volumes.get(key)
+        if entry is not None:
+            self.__switch_volume(key, entry)
+            return
+        if self.prefetcher is not None and series_key(self.prefetcher.path) == key:
+            self._pending = key
+            self.ui.statusbar.showMessage('Cargando...')
+            return
+
+        # Se cargan las imágenes DICOM en un hilo del pool; cada señal
+        # lleva el worker que la emitió para descartar las de cargas
+        # anteriores
+        worker = LoadWorker(path, cache=self.cache, lazy=True)
+        worker.signals.opened.connect(partial(self._on_opened, worker))
+        worker.signals.progress.connect(partial(self._on_progress, worker))
+        worker.signals.finished.connect(partial(self._on_loaded, worker))
+        worker.signals.failed.connect(partial(self._on_failed, worker))
+        worker.signals.cancelled.connect(partial(self._on_cancelled, worker))
+        self.worker = worker
+        self.__show_progress(True)
+        self.ui.statusbar.showMessage('Cargando...')
+        QThreadPool.globalInstance().start(worker)
+
+
+    def _on_opened(self, worker: LoadWorker, dcm: DicomLoader) -> None:
+        if worker is not self.worker:
             return
+        # Cabeceras leídas: el volumen existe pero aún no tiene píxeles
+        self.dcm = dcm
+        self.progress_bar.setRange(0, len(dcm.frames))
+        self._shown = False
 
-        # Límites espectrales
+
+    def _on_progress(self, worker: LoadWorker, ready: int, total: int) -> None:
+        if worker is not self.worker:
+            return
+        self.progress_bar.setValue(ready)
+
+        # Con el primer corte decodificado se muestra la vista axial
+        if not self._shown:
+            self._shown = True
+            self.__show_volume()
+            return
+
+        # El corte axial seleccionado se dibuja en cuanto está listo, y
+        # los planos sagital y coronal se completan poco a poco
+        if self.ui.axialSpinBox.value() == ready - 1:
+            self.scheduler.request('axial', ready - 1)
+        if ready % max(total // 20, 1) == 0:
+            self.scheduler.request('sagital', self.ui.sagitalSpinBox.value())
+            self.scheduler.request('coronal', self.ui.coronalSpinBox.value())
+            self.__update_histogram()
+
+
+    def __show_volume(self, entry: dict | None = None) -> None:
+        # Límites espectrales y tabla de conversión compartida por las
+        # tres vistas
         self.min_spectrum = self.dcm.min
         self.max_spectrum = self.dcm.max
+        self.lut = WindowLUT(self.dcm.dtype, self.dcm.slope, self.dcm.intercept)
+        self.lut.set_window(self.min_spectrum, self.max_spectrum)
+
+        # Planos contiguos con la relación de aspecto física. Un volumen ya
+        # abierto conserva su pirámide, sus copias y sus tablas de losas
+        from Reslicer import Reslicer
+        entry = entry or {}
+        self.reslicer = entry.get('reslicer') or Reslicer(self.dcm)
+        self.pyramid = entry.get('pyramid')
+        self.slabs = entry.get('slabs')
+        self._coarse.clear()
+        self._displayed.clear()
+
+        # Separación entre cortes consecutivos de cada plano, para pasar el
+        # grosor de la losa de mm a cortes
+        self.spacing = {
+            'axial': self.dcm.st, 'sagital': self.dcm.ps[1], 'coronal': self.dcm.ps[0],
+        }
 
         # Se habilitan los elementos gráficos
         self.__enable_inputs()
         self.__set_spectrum_limits()
         self.__set_plane_limits()
-        self.__connect_ui_components()
+        self.__update_histogram()
 
         # Se dibujan los planos
-        self._draw_plane('axial', 0)
-        self._draw_plane('sagital', 0)
-        self._draw_plane('coronal', 0)
+        self.__request_planes()
+        self.__update_crosshairs()
+
+
+    def __update_crosshairs(self) -> None:
+        # Cada vista muestra la posición de los cortes de las otras dos; sólo
+        # se mueven las líneas, sin volver a pintar las imágenes. Las filas
+        # se escalan como en el remuestreo del plano
+        y, x, z = self.dcm.shape
+        axial, sagital, coronal = (
+            self.spin_boxes[plane].value() for plane in ('axial', 'sagital', 'coronal')
+        )
+        for plane, (col, row, n) in {
+            'axial': (sagital, coronal, y),
+            'sagital': (coronal, axial, z),
+            'coronal': (sagital, axial, z),
+        }.items():
+            rows = self.reslicer.shape(plane)[0]
+            self.renderers[plane].set_crosshair(col + 0.5, (row + 0.5) * rows / n)
+
+
+    def __request_planes(self) -> None:
+        # Se agenda el dibujo de las tres vistas en su corte actual
+        self.scheduler.request('axial', self.ui.axialSpinBox.value())
+        self.scheduler.request('sagital', self.ui.sagitalSpinBox.value())
+        self.scheduler.request('coronal', self.ui.coronalSpinBox.value())
+
+
+    def _on_loaded(self, worker: LoadWorker, dcm: DicomLoader) -> None:
+        if worker is not self.worker:
+            return
+        self.worker = None
+        self.__show_progress(False)
+        self.ui.statusbar.clearMessage()
+        self.__finish_volume(series_key(worker.path))
 
         QMessageBox.information(
             self,
             'Archivos cargados',
-            f'Se cargaron {len(self.dcm.slices)} archivos'
+            f'Se cargaron {len(self.dcm.files)} archivos'
         )
 
 
-    def _draw_plane(self, plane: str, index: int) -> None:
-        print('draw_plane')
-        # Se obtiene la matriz de píxeles del corte indicado por index
-        data = self.dcm.plane(plane, index)
+    def __finish_volume(self, key) -> None:
+        # Con el volumen completo se crean las estructuras que le faltan, se
+        # actualizan los límites espectrales y se guarda entre los abiertos
+        if self.pyramid is None:
+            self.reslicer.build()
+            self.pyramid = VolumePyramid(self.dcm.volume, **self.pyramid_options)
+            self.pyramid.build()
+        if self.slabs is None:
+            self.slabs = SlabEngine(self.dcm.volume)
+        mode = SLAB_MODES[self.ui.slabModeComboBox.currentIndex()]
+        if mode is not None and mode != self.slabs.mode:
+            self.slabs.prepare(mode)
 
-        # Inicialización del canvas para mostrar el corte
-        fig = Figure(figsize=plt.figaspect(data)/2)
-        canvas = FigureCanvas(fig)
-        scene = QGraphicsScene()
-        scene.addWidget(canvas)
+        self.min_spectrum = self.dcm.min
+        self.max_spectrum = self.dcm.max
+        self.scheduler.request_window(self.min_spectrum, self.max_spectrum)
+        self.__set_spectrum_limits()
+        self.__update_histogram()
+        self.__request_planes()
+
+        self.key = key
+        if key == self.base_key:
+            self.base = self.dcm
+            self.ui.actionIsotropico.setEnabled(True)
+            self.ui.actionReducirRuido.setEnabled(True)
+        self.volumes.put(
+            key, self.dcm, keep=(key,),
+            reslicer=self.reslicer, pyramid=self.pyramid, slabs=self.slabs
+        )
+        self.__prefetch_next()
+
+
+    def __switch_volume(self, key, entry: dict) -> None:
+        # Serie ya en memoria: se muestra sin leer ningún archivo
+        self.dcm = entry['dcm']
+        self.__show_volume(entry)
+        self.__finish_volume(key)
+
+
+    def __prefetch_next(self) -> None:
+        # Se carga en segundo plano la serie siguiente de la lista, si no
+        # está ya en memoria ni cargándose
+        from LoadWorker import LoadWorker
+        if self.series_index is None or self.series_index + 1 >= len(self.series):
+            return
+        path = self.series[self.series_index + 1]['files']
+        key = series_key(path)
+        if key in self.volumes:
+            return
+        if self.prefetcher is not None:
+            if series_key(self.prefetcher.path) == key:
+                return
+            self.__cancel_prefetch()
+        # El volumen ocupa al menos lo que sus archivos (más si están
+        # comprimidos): si ni eso cabe junto a la serie mostrada, no se
+        # carga por adelantado
+        try:
+            estimate = sum(os.path.getsize(f) for f in path)
+        except OSError:
+            return
+        if not self.volumes.fits(estimate, (self.key,)):
+            return
+        worker = LoadWorker(path, cache=self.cache)
+        worker.signals.finished.connect(partial(self._on_prefetched, worker))
+        worker.signals.failed.connect(partial(self._on_prefetch_failed, worker))
+        worker.signals.cancelled.connect(partial(self._on_prefetch_failed, worker, ''))
+        self.prefetcher = worker
+        self.prefetch_pool.start(worker)
 
-        # Según el plano, se dibuja en su vista correspondiente
-        match plane:
-            case 'axial':
-                self.ui.axialView.setScene(scene)
-            case 'sagital':
-                self.ui.sagitalView.setScene(scene)
-            case 'coronal':
-                self.ui.coronalView.setScene(scene)
 
-        # Eliminación de bordes y labels de la imagen
-        ax = fig.add_axes([0, 0, 1, 1])
-        ax.set_axis_off()
+    def __cancel_prefetch(self) -> None:
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+            self.prefetcher = None
+        self._pending = None
 
-        # Se muestra la imagen
-        ax.imshow(data, cmap = 'gray', vmin=self.min_spectrum, vmax=self.max_spectrum, aspect='auto')
+
+    def _on_prefetched(self, worker: LoadWorker, dcm: DicomLoader) -> None:
+        if worker is not self.prefetcher:
+            return
+        self.prefetcher = None
+        # Si se pidió mientras se cargaba, pasa a ser la serie mostrada y
+        # se conserva aunque supere el presupuesto por sí sola. Si no, se
+        # descarta cuando no cabe junto a la mostrada, y se cargará (desde
+        # la caché de disco) al abrirla
+        key = series_key(worker.path)
+        if self._pending == key:
+            self._pending = None
+            self.ui.statusbar.clearMessage()
+            self.__switch_volume(key, self.volumes.put(key, dcm, keep=(key,)))
+            return
+        self.volumes.put(key, dcm, keep=(self.key,))
+
+
+    def _on_prefetch_failed(self, worker: LoadWorker, message: str) -> None:
+        # Los errores se informan cuando se abre la serie
+        if worker is not self.prefetcher:
+            return
+        self.prefetcher = None
+        if self._pending == series_key(worker.path):
+            self._pending = None
+            self._load_planes(worker.path)
+
+
+    def __reset_processing(self, key) -> None:
+        # Cada serie se abre sin procesar; las opciones se habilitan cuando
+        # su volumen está completo
+        self.base = None
+        self.base_key = key
+        self.processor = None
+        for action in (self.ui.actionIsotropico, self.ui.actionReducirRuido):
+            action.blockSignals(True)
+            action.setChecked(False)
+            action.setEnabled(False)
+            action.blockSignals(False)
+
+
+    def __switch_processed(self, key, entry: dict) -> None:
+        # Se conserva el punto señalado: los índices se escalan a las
+        # dimensiones del nuevo volumen
+        y, x, z = self.dcm.shape
+        position = {
+            'axial': (self.ui.axialSpinBox.value() + 0.5) / z,
+            'sagital': (self.ui.sagitalSpinBox.value() + 0.5) / x,
+            'coronal': (self.ui.coronalSpinBox.value() + 0.5) / y,
+        }
+        self.__switch_volume(key, entry)
+        y, x, z = self.dcm.shape
+        for plane, n in (('axial', z), ('sagital', x), ('coronal', y)):
+            self.spin_boxes[plane].setValue(int(position[plane] * n))
+
+
+    def _on_processed(self, worker: ProcessWorker, key, dcm: DicomLoader) -> None:
+        if worker is not self.processor:
+            return
+        self.processor = None
+        self.ui.statusbar.clearMessage()
+        self.__switch_processed(key, self.volumes.put(key, dcm, keep=(key,)))
+
+
+    def _on_process_failed(self, worker: ProcessWorker, message: str) -> None:
+        if worker is not self.processor:
+            return
+        self.processor = None
+        self.ui.statusbar.clearMessage()
+        QMessageBox.critical(self, 'Error', message)
+
+
+    def _on_failed(self, worker: LoadWorker | ScanWorker, message: str) -> None:
+        if worker is not self.worker:
+            return
+        self.worker = None
+        self.__show_progress(False)
+        self.ui.statusbar.clearMessage()
+        QMessageBox.critical(self, 'Error', message)
+
+
+    def _on_cancelled(self, worker: LoadWorker) -> None:
+        if worker is not self.worker:
+            return
+        self.worker = None
+        self.__show_progress(False)
+        self.ui.statusbar.showMessage('Carga cancelada', 3000)
+
+
+    def _draw_plane(self, plane: str, index: int, full: bool = False) -> None:
+        instrument.count(f'draw.{plane}')
+        # Los cortes axiales que aún no se han cargado se decodifican al
+        # pedirlos (modo perezoso); si no, no se dibujan
+        if plane == 'axial' and index >= self.dcm.ready and not self.dcm.lazy:
+            return
+
+        # Con el volumen completo, la losa centrada en el corte se proyecta
+        # según el modo elegido
+        mode = thickness = None
+        if self.slabs is not None:
+            mode = SLAB_MODES[self.ui.slabModeComboBox.currentIndex()]
+        if mode is not None:
+            thickness = round(self.ui.slabDoubleSpinBox.value() / self.spacing[plane])
+            thickness = max(thickness, 1)
+
+        # Mientras se arrastra el slider o la cruz se usa un nivel reducido
+        # de la pirámide, escalado al tamaño del plano completo
+        factor = None
+        dragging = self.sliders[plane].isSliderDown() or self._dragging
+        if mode is None and not full and self.pyramid is not None and dragging:
+            factor = self.pyramid.preview_factor(plane)
+
+        # Si la vista ya muestra este plano sólo se vuelve a aplicar la
+        # ventana, y si tampoco cambió la ventana no se pinta
+        key = (index, self.dcm.ready, mode, thickness, factor)
+        shown = self._displayed.get(plane)
+        if shown is not None and shown[0] == key:
+            if shown[3] == self.lut.window:
+                instrument.count('draw.skipped')
+                return
+            data, shape = shown[1], shown[2]
+        else:
+            data, shape = self.__plane_data(plane, index, mode, thickness, factor)
+        self._displayed[plane] = (key, data, shape, self.lut.window)
+
+        # Se aplica la ventana espectral y se envía el corte a su vista
+        self.renderers[plane].set_image(self.lut.apply(data), shape)
+
+
+    def __plane_data(self, plane: str, index: int, mode: str | None,
+                     thickness: int | None, factor: int | None
+                     ) -> tuple[np.ndarray, tuple[int, int] | None]:
+        # Matriz de píxeles guardados del plano y, en las vistas previas,
+        # el tamaño al que se escala
+        if mode is not None:
+            data = self.slabs.slab(mode, plane, index, thickness)
+            return self.reslicer.resample(plane, data), None
+        if factor is None:
+            self._coarse.pop(plane, None)
+            return self.reslicer.plane(plane, index), None
+        self._coarse[plane] = index
+        self.refine_timer.start()
+        return self.pyramid.plane(factor, plane, index), self.reslicer.shape(plane)
+
+
+    def _refine(self) -> None:
+        # Se dibujan en resolución completa las vistas que quedaron con
+        # una vista previa
+        for plane, index in list(self._coarse.items()):
+            self._draw_plane(plane, index, full=True)
+
+
+    def _set_window(self, vmin: float, vmax: float) -> None:
+        self.lut.set_window(vmin, vmax)
 
 
     @Slot()
     def open_folder(self) -> None:
-        print('open_folder')
         path = QFileDialog.getExistingDirectory(
             self,
             'Seleccionar carpeta'
         )
         if path:
-            self._load_planes(path + '/*')
+            self._scan_folder(path)
+
+
+    @Slot()
+    def cancel_load(self) -> None:
+        # El worker deja de ser el actual en cuanto se cancela: sus señales
+        # posteriores, incluida la de cancelación, se descartan
+        self._pending = None
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+            self.__show_progress(False)
+            self.ui.statusbar.showMessage('Carga cancelada', 3000)
+
+
+    @Slot()
+    def export_trace(self) -> None:
+        path, _ = QFileDialog.getSaveFileName(
+            self, 'Exportar traza', 'traza.json', 'Traza de Chrome (*.json)'
+        )
+        if path:
+            instrument.export_trace(path)
+            self.ui.statusbar.showMessage(f'Traza guardada en {path}', 3000)
+
+
+    def closeEvent(self, event: QCloseEvent) -> None:
+        self.cancel_load()
+        self.__cancel_prefetch()
+        self.prefetch_pool.waitForDone(PREFETCH_CLOSE_TIMEOUT)
+        if TRACE_PATH:
+            instrument.export_trace(TRACE_PATH)
+        super().closeEvent(event)
 
 
     @Slot()
     def update_spectrum(self) -> None:
-        print('update_spectrum')
+        instrument.count('update_spectrum')
         # Valores de actualización de la ventana espectro
         self.min_spectrum = self.ui.minDoubleSpinBox.value()
         self.max_spectrum = self.ui.maxDoubleSpinBox.value()
@@ -174,41 +765,121 @@ class MainWindow(QMainWindow):
         self.ui.minDoubleSpinBox.setMaximum(self.max_spectrum)
         self.ui.maxDoubleSpinBox.setMinimum(self.min_spectrum)
 
-        # Se recupera el index actual
-        axial_index = self.ui.axialSpinBox.value()
-        sagital_index = self.ui.sagitalSpinBox.value()
-        coronal_index = self.ui.coronalSpinBox.value()
+        # Se redibujan los planos con la nueva resolución espectral
+        self.scheduler.request_window(self.min_spectrum, self.max_spectrum)
+        self.ui.histogramWidget.set_window(self.min_spectrum, self.max_spectrum)
+        self.__request_planes()
 
-        # Se redibuja el plano con la nueva resolución espectral
-        self._draw_plane('axial', axial_index)
-        self._draw_plane('sagital', sagital_index)
-        self._draw_plane('coronal', coronal_index)
+
+    @Slot()
+    def apply_preset(self, index: int) -> None:
+        vmin, vmax = self.ui.presetComboBox.itemData(index)
+
+        # Se restablecen los rangos para que el nuevo límite inferior no
+        # quede acotado por el superior anterior, y viceversa
+        spin_boxes = (self.ui.minDoubleSpinBox, self.ui.maxDoubleSpinBox)
+        for spin_box in spin_boxes:
+            spin_box.blockSignals(True)
+            spin_box.setRange(self.dcm.min, self.dcm.max)
+        self.ui.minDoubleSpinBox.setValue(vmin)
+        self.ui.maxDoubleSpinBox.setValue(vmax)
+        for spin_box in spin_boxes:
+            spin_box.blockSignals(False)
+
+        self.update_spectrum()
+
+
+    @Slot()
+    def update_slab(self) -> None:
+        # Las tablas del nuevo modo se construyen en segundo plano; mientras
+        # tanto la losa se calcula directamente
+        mode = SLAB_MODES[self.ui.slabModeComboBox.currentIndex()]
+        if self.slabs is not None and mode is not None and mode != self.slabs.mode:
+            self.slabs.prepare(mode)
+        self.__request_planes()
+
+
+    @Slot()
+    def update_processing(self) -> None:
+        # El volumen procesado se guarda entre los abiertos como una serie
+        # más, así que volver a una combinación ya calculada es inmediato
+        from LoadWorker import ProcessWorker
+        if self.base is None:
+            return
+        isotropic = self.ui.actionIsotropico.isChecked()
+        denoise = self.ui.actionReducirRuido.isChecked()
+        key = (self.base_key, isotropic, denoise) if isotropic or denoise else self.base_key
+        self.processor = None
+        entry = self.volumes.get(key)
+        if entry is None and key == self.base_key:
+            entry = {'dcm': self.base}
+        if entry is not None:
+            self.ui.statusbar.clearMessage()
+            self.__switch_processed(key, entry)
+            return
+
+        worker = ProcessWorker(self.base, isotropic, denoise)
+        worker.signals.finished.connect(partial(self._on_processed, worker, key))
+        worker.signals.failed.connect(partial(self._on_process_failed, worker))
+        self.processor = worker
+        self.ui.statusbar.showMessage('Procesando volumen...')
+        QThreadPool.globalInstance().start(worker)
+
+
+    @Slot()
+    def open_series(self, row: int) -> None:
+        if not 0 <= row < len(self.series):
+            return
+        self.series_index = row
+        self._load_planes(self.series[row]['files'])
+
+
+    @Slot()
+    def pick(self, plane: str, x: float, y: float) -> None:
+        # Punto de una vista, en píxeles del plano remuestreado, llevado al
+        # corte de las otras dos; los spinbox acotan los índices
+        if not self.ui.axialSpinBox.isEnabled():
+            return
+        self._dragging = True
+        dim_y, dim_x, dim_z = self.dcm.shape
+        rows = self.reslicer.shape(plane)[0]
+        col = int(x)
+        match plane:
+            case 'axial':
+                targets = {'sagital': col, 'coronal': int(y * dim_y / rows)}
+            case 'sagital':
+                targets = {'axial': int(y * dim_z / rows), 'coronal': col}
+            case 'coronal':
+                targets = {'axial': int(y * dim_z / rows), 'sagital': col}
+        for target, index in targets.items():
+            self.spin_boxes[target].setValue(index)
+
+
+    @Slot()
+    def _end_drag(self) -> None:
+        # Al soltar, las vistas previas se refinan a resolución completa
+        if self._dragging:
+            self._dragging = False
+            self.refine_timer.start()
 
 
     @Slot()
     def update_plane(self, plane: str, index: int) -> None:
-        print('Update plane')
-        try:
-            # Se dibuja el corte en el plano seleccionado
-           self._draw_plane(plane, index)
-           # Modificación de los valores del slider/spinbox según el plano
-           match plane:
-               case 'axial':
-                   self.ui.axialSlider.setValue(index)
-                   self.ui.axialSpinBox.setValue(index)
-               case 'sagital':
-                   self.ui.sagitalSlider.setValue(index)
-                   self.ui.sagitalSpinBox.setValue(index)
-               case 'coronal':
-                   self.ui.coronalSlider.setValue(index)
-                   self.ui.coronalSpinBox.setValue(index)
-
-        # En caso de no haber abierto la carpeta
-        except AttributeError as e:
-            print(e)
-            QMessageBox.critical(
-                self, 'Error', 'No hay archivos seleccionados.'
-            )
+        instrument.count('update_plane')
+        # Modificación del slider según el plano; el spinbox ya tiene el
+        # valor, así que no se vuelve a emitir la señal
+        match plane:
+            case 'axial':
+                self.ui.axialSlider.setValue(index)
+            case 'sagital':
+                self.ui.sagitalSlider.setValue(index)
+            case 'coronal':
+                self.ui.coronalSlider.setValue(index)
+
+        # Se agenda el dibujo del corte en el plano seleccionado y se
+        # mueven las cruces de las demás vistas
+        self.scheduler.request(plane, index)
+        self.__update_crosshairs()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,6 @@
+# This Python file uses the following encoding: utf-8
+import os
+import sys
+
+# Los módulos del visor están en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
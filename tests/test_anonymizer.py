@@ -0,0 +1,136 @@
+# This Python file uses the following encoding: utf-8
+import os
+
+import numpy as np
+import pydicom
+import pytest
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.encaps import encapsulate
+from pydicom.sequence import Sequence
+from pydicom.uid import (
+    CTImageStorage, ExplicitVRLittleEndian, ImplicitVRLittleEndian,
+    JPEG2000Lossless, generate_uid
+)
+
+from Anonymizer import Anonymizer, PARTIAL_PROFILE
+from DicomLoader import DicomLoader
+from benchmark import generate_series
+
+# Valores identificativos que no pueden quedar en ningún byte del archivo
+SECRETS = [b'Perez^Juan', b'HC-123456', b'Hospital Central', b'Dr^Lopez',
+           b'SECRETO-PRIVADO', b'SECRETO-FINAL', b'19700101']
+
+
+def sample(path: str, syntax: str = ExplicitVRLittleEndian) -> str:
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = CTImageStorage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = syntax
+
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.SOPClassUID = CTImageStorage
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.StudyInstanceUID = generate_uid()
+    ds.SeriesInstanceUID = generate_uid()
+    ds.FrameOfReferenceUID = generate_uid()
+    ds.PatientName = 'Perez^Juan'
+    ds.PatientID = 'HC-123456'
+    ds.PatientBirthDate = '19700101'
+    ds.PatientSex = 'M'
+    ds.InstitutionName = 'Hospital Central'
+    ds.ReferringPhysicianName = 'Dr^Lopez'
+    ds.Modality = 'CT'
+    ds.Rows = ds.Columns = 4
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = 'MONOCHROME2'
+    ds.BitsAllocated = ds.BitsStored = 8
+    ds.HighBit = 7
+    ds.PixelRepresentation = 0
+
+    # Secuencia con un UID y un nombre que hay que tratar dentro del ítem
+    item = Dataset()
+    item.ReferencedSOPClassUID = CTImageStorage
+    item.ReferencedSOPInstanceUID = generate_uid()
+    item.OperatorsName = 'Dr^Lopez'
+    ds.ReferencedImageSequence = Sequence([item])
+
+    # Grupos privados antes y después de los píxeles, y relleno final
+    block = ds.private_block(0x0009, 'QDICOM PRUEBA', create=True)
+    block.add_new(0x01, 'LO', 'SECRETO-PRIVADO')
+    trailing = ds.private_block(0x7FE1, 'QDICOM PRUEBA', create=True)
+    trailing.add_new(0x01, 'LO', 'SECRETO-FINAL')
+    ds.add_new(0xFFFCFFFC, 'OB', b'SECRETO-FINAL\0\0\0')
+
+    pixels = np.arange(16, dtype=np.uint8).reshape(4, 4)
+    if syntax == JPEG2000Lossless:
+        # Fragmento opaco: sólo importa que se copie tal cual
+        ds.PixelData = encapsulate([pixels.tobytes()])
+        ds['PixelData'].VR = 'OB'
+    else:
+        ds.PixelData = pixels.tobytes()
+    ds.save_as(path, write_like_original=False)
+    return path
+
+
+@pytest.mark.parametrize('syntax', [
+    ExplicitVRLittleEndian, ImplicitVRLittleEndian, JPEG2000Lossless
+])
+def test_file_is_deidentified(tmp_path, syntax):
+    src = sample(os.path.join(tmp_path, 'src.dcm'), syntax)
+    dst = os.path.join(tmp_path, 'dst.dcm')
+    Anonymizer(salt='prueba').file(src, dst)
+
+    with open(dst, 'rb') as f:
+        data = f.read()
+    for secret in SECRETS:
+        assert secret not in data
+
+    before = pydicom.dcmread(src)
+    after = pydicom.dcmread(dst)
+    assert all(not elem.tag.is_private for elem in after.iterall())
+    assert 'DataSetTrailingPadding' not in after
+    assert str(after.PatientName) == 'ANONIMO'
+    assert after.PatientBirthDate == '' and after.ReferringPhysicianName == ''
+    assert 'InstitutionName' not in after
+    assert after.PatientIdentityRemoved == 'YES'
+    for keyword in ('StudyInstanceUID', 'SeriesInstanceUID', 'SOPInstanceUID',
+                    'FrameOfReferenceUID'):
+        assert after[keyword].value != before[keyword].value
+    assert after.file_meta.MediaStorageSOPInstanceUID == after.SOPInstanceUID
+
+    # Dentro de las secuencias se aplican las mismas acciones
+    item = after.ReferencedImageSequence[0]
+    assert item.ReferencedSOPInstanceUID != before.ReferencedImageSequence[0].ReferencedSOPInstanceUID
+    assert item.ReferencedSOPClassUID == CTImageStorage
+    assert 'OperatorsName' not in item
+
+    # Los píxeles se copian sin cambios
+    assert after.PixelData == before.PixelData
+
+
+def test_same_salt_gives_same_uids(tmp_path):
+    src = sample(os.path.join(tmp_path, 'src.dcm'))
+    outputs = []
+    for name in ('a.dcm', 'b.dcm'):
+        Anonymizer(salt='prueba').file(src, os.path.join(tmp_path, name))
+        outputs.append(pydicom.dcmread(os.path.join(tmp_path, name)))
+    assert outputs[0].StudyInstanceUID == outputs[1].StudyInstanceUID
+    assert outputs[0].PatientID == outputs[1].PatientID
+
+
+def test_profile_keywords_are_known():
+    assert len(Anonymizer(PARTIAL_PROFILE).profile) == len(PARTIAL_PROFILE)
+    with pytest.raises(ValueError):
+        Anonymizer({'NoExiste': 'remove'})
+
+
+def test_loader_keeps_relative_paths(tmp_path):
+    # Archivos con el mismo nombre en subdirectorios distintos
+    files = (generate_series(os.path.join(tmp_path, 'serie', 'a'), 2, 8, 8)
+             + generate_series(os.path.join(tmp_path, 'serie', 'b'), 2, 8, 8))
+    output = os.path.join(tmp_path, 'anonimos')
+    report = DicomLoader(files).anonymize(override=False, output=output, salt='x')
+    assert report['files'] == 4
+    assert sorted(os.listdir(output)) == ['a', 'b']
+    assert len(os.listdir(os.path.join(output, 'a'))) == 2
@@ -0,0 +1,66 @@
+# This Python file uses the following encoding: utf-8
+import os
+
+import numpy as np
+import pytest
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.sequence import Sequence
+from pydicom.uid import (
+    ExplicitVRLittleEndian, SecondaryCaptureImageStorage, generate_uid
+)
+
+from DicomLoader import DicomLoader, DICOMNotFound
+from benchmark import generate_series
+
+
+def multiframe(path: str, frames: int = 4, geometry: bool = True) -> str:
+    # Objeto multiframe de 16x16, con la geometría en los grupos
+    # funcionales compartidos o sin ella (como una captura secundaria)
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = SecondaryCaptureImageStorage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.SOPClassUID = SecondaryCaptureImageStorage
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.InstanceNumber = 1
+    ds.NumberOfFrames = frames
+    ds.Rows, ds.Columns = 16, 16
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = 'MONOCHROME2'
+    ds.BitsAllocated = ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 0
+    if geometry:
+        measures = Dataset()
+        measures.PixelSpacing = [0.5, 0.5]
+        measures.SliceThickness = 2.0
+        position = Dataset()
+        position.ImagePositionPatient = [0.0, 0.0, 0.0]
+        shared = Dataset()
+        shared.PixelMeasuresSequence = Sequence([measures])
+        shared.PlanePositionSequence = Sequence([position])
+        ds.SharedFunctionalGroupsSequence = Sequence([shared])
+    ds.PixelData = np.arange(frames * 256, dtype=np.uint16).tobytes()
+    ds.save_as(path, write_like_original=False)
+    return path
+
+
+def test_multiframe_with_geometry(tmp_path):
+    dcm = DicomLoader([multiframe(os.path.join(tmp_path, 'mf.dcm'))])
+    assert dcm.shape == (16, 16, 4)
+    assert dcm.ps == [0.5, 0.5] and dcm.st == 2.0
+    assert dcm.plane('axial', 1)[0, 0] == 256
+
+
+def test_multiframe_without_geometry_is_skipped(tmp_path):
+    path = multiframe(os.path.join(tmp_path, 'sc.dcm'), geometry=False)
+    with pytest.raises(DICOMNotFound):
+        DicomLoader([path])
+
+    # Junto a una serie normal, la captura secundaria se salta
+    files = generate_series(os.path.join(tmp_path, 'ct'), 3, 16, 16)
+    dcm = DicomLoader(files + [path])
+    assert dcm.shape == (16, 16, 3)
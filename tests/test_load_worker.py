@@ -0,0 +1,30 @@
+# This Python file uses the following encoding: utf-8
+import os
+
+import numpy as np
+
+from LoadWorker import LoadWorker, ProcessWorker
+from benchmark import generate_series
+
+
+def run(worker) -> tuple[list, list]:
+    # El worker se ejecuta en el hilo de la prueba: las señales llegan
+    # directamente
+    finished, failed = [], []
+    worker.signals.finished.connect(finished.append)
+    worker.signals.failed.connect(failed.append)
+    worker.run()
+    return finished, failed
+
+
+def test_unexpected_error_is_reported(tmp_path):
+    # Un ValueError (tipo que no puede guardar la serie) no es un error
+    # de lectura, pero la interfaz tiene que enterarse igual
+    files = generate_series(os.path.join(tmp_path, 'ct'), 2, 16, 16)
+    finished, failed = run(LoadWorker(files, dtype=np.uint8))
+    assert finished == [] and len(failed) == 1
+
+
+def test_process_error_is_reported():
+    finished, failed = run(ProcessWorker(object(), isotropic=True))
+    assert finished == [] and len(failed) == 1
@@ -0,0 +1,21 @@
+# This Python file uses the following encoding: utf-8
+import os
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide2.QtWidgets import QApplication
+
+import mainwindow
+
+
+def test_preview_options_are_configurable():
+    app = QApplication.instance() or QApplication([])
+    window = mainwindow.MainWindow(refine_delay=40, frame_interval=8,
+                                   pyramid_factors=(2,), pyramid_overhead=0.5,
+                                   min_preview_size=32)
+    assert window.refine_timer.interval() == 40
+    assert window.scheduler._timer.interval() == 8
+    assert window.pyramid_options == {
+        'factors': (2,), 'max_overhead': 0.5, 'min_preview_size': 32
+    }
+    window.close()
@@ -0,0 +1,80 @@
+# This Python file uses the following encoding: utf-8
+import os
+import json
+import threading
+
+import numpy as np
+
+from VolumeCache import VolumeCache
+from benchmark import generate_series
+
+
+def test_concurrent_use(tmp_path):
+    # La carga principal y la anticipada comparten la caché: claves y
+    # escrituras simultáneas dejan un índice válido con todas las series
+    import pydicom
+    cache = VolumeCache(os.path.join(tmp_path, 'cache'))
+    series = []
+    for i in range(4):
+        files = generate_series(os.path.join(tmp_path, f's{i}'), 20, 8, 8, seed=i)
+        series.append((files, [pydicom.dcmread(f, stop_before_pixels=True) for f in files]))
+
+    errors = []
+
+    def worker(files, datasets) -> None:
+        try:
+            for _ in range(5):
+                key = cache.key(files, datasets)
+                cache.store(key, files, np.zeros((2, 8, 8), np.int16), {})
+                assert cache.load(key) is not None
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=s) for s in series]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with open(os.path.join(tmp_path, 'cache', 'index.json')) as f:
+        index = json.load(f)
+    assert len(index['series']) == 4
+    assert not [f for f in os.listdir(os.path.join(tmp_path, 'cache')) if f.endswith('.tmp')]
+
+
+def test_open_volume_is_not_evicted(tmp_path):
+    # Un volumen mapeado que sigue en uso no se borra al liberar espacio
+    cache = VolumeCache(os.path.join(tmp_path, 'cache'), max_bytes=200)
+    cache.store('a', [], np.zeros(16, np.int64), {})
+    volume, _ = cache.load('a')
+    cache.store('b', [], np.zeros(16, np.int64), {})
+    assert cache.load('a') is not None
+    assert not volume.any()
+
+    del volume
+    cache.store('c', [], np.zeros(16, np.int64), {})
+    assert cache.load('a') is None
+
+
+def test_failed_removal_is_retried(tmp_path, monkeypatch):
+    # Si el archivo no se puede borrar (Windows con el archivo abierto en
+    # otro proceso) se anota y se vuelve a intentar en la siguiente limpieza
+    directory = os.path.join(tmp_path, 'cache')
+    cache = VolumeCache(directory, max_bytes=200)
+    cache.store('a', [], np.zeros(16, np.int64), {})
+
+    remove = os.remove
+
+    def locked(path):
+        raise PermissionError(path)
+
+    monkeypatch.setattr(os, 'remove', locked)
+    cache.store('b', [], np.zeros(16, np.int64), {})
+    assert cache.load('a') is None
+    assert os.path.exists(os.path.join(directory, 'a.npy'))
+
+    monkeypatch.setattr(os, 'remove', remove)
+    cache.store('c', [], np.zeros(16, np.int64), {})
+    assert not os.path.exists(os.path.join(directory, 'a.npy'))
+    assert os.path.exists(os.path.join(directory, 'c.npy'))
@@ -0,0 +1,42 @@
+# This Python file uses the following encoding: utf-8
+from types import SimpleNamespace
+
+import numpy as np
+
+from VolumeManager import VolumeManager
+
+
+def loader(nbytes: int) -> SimpleNamespace:
+    return SimpleNamespace(volume=np.zeros(nbytes, np.uint8))
+
+
+def test_put_respects_budget_next_to_displayed_volume():
+    # Un volumen cargado por adelantado que no cabe junto al mostrado se
+    # rechaza, sin descartar el mostrado ni superar el presupuesto
+    volumes = VolumeManager(max_bytes=150)
+    volumes.put('a', loader(100), keep=('a',))
+    assert not volumes.fits(100, ('a',))
+    assert volumes.put('b', loader(100), keep=('a',)) is None
+    assert volumes.keys() == ['a']
+    assert volumes.total_bytes() <= volumes.max_bytes
+
+    assert volumes.fits(50, ('a',))
+    assert volumes.put('c', loader(50), keep=('a',)) is not None
+    assert volumes.keys() == ['a', 'c']
+    assert volumes.total_bytes() <= volumes.max_bytes
+
+
+def test_put_evicts_least_recent():
+    volumes = VolumeManager(max_bytes=250)
+    for key in ('a', 'b', 'c'):
+        volumes.put(key, loader(100), keep=('c',))
+    assert volumes.keys() == ['b', 'c']
+    volumes.get('b')
+    volumes.put('d', loader(100), keep=('b',))
+    assert volumes.keys() == ['b', 'd']
+
+
+def test_displayed_entry_larger_than_budget_is_kept():
+    volumes = VolumeManager(max_bytes=50)
+    entry = volumes.put(('x', 'y'), loader(100), keep=(('x', 'y'),))
+    assert volumes.get(('x', 'y')) is entry
@@ -0,0 +1,49 @@
+# This Python file uses the following encoding: utf-8
+import numpy as np
+
+from VolumePyramid import VolumePyramid
+
+
+def test_thin_series_has_no_empty_levels():
+    # Con menos cortes que el factor no se construye el nivel y las vistas
+    # previas usan la resolución completa
+    volume = np.zeros((3, 512, 512), np.int16)
+    pyramid = VolumePyramid(volume)
+    pyramid._build_levels()
+    assert all(0 not in level.shape for level in pyramid.levels.values())
+    assert 4 not in pyramid.levels
+    for plane in ('axial', 'sagital', 'coronal'):
+        factor = pyramid.preview_factor(plane)
+        if factor is not None:
+            assert pyramid.plane(factor, plane, 2).size > 0
+
+
+def test_single_slice_series():
+    pyramid = VolumePyramid(np.zeros((1, 256, 256), np.uint8))
+    pyramid._build_levels()
+    assert pyramid.levels == {}
+    assert pyramid.preview_factor('axial') is None
+
+
+def test_level_is_block_mean():
+    volume = np.arange(8 * 8 * 8, dtype=np.float32).reshape(8, 8, 8)
+    pyramid = VolumePyramid(volume, factors=(2,))
+    pyramid._build_levels()
+    expected = volume.reshape(4, 2, 4, 2, 4, 2).mean(axis=(1, 3, 5))
+    assert np.array_equal(pyramid.levels[2], expected)
+    assert np.array_equal(pyramid.plane(2, 'axial', 5), expected[2])
+
+
+def test_min_preview_size_is_configurable():
+    pyramid = VolumePyramid(np.zeros((64, 256, 256), np.uint8), min_preview_size=32)
+    pyramid._build_levels()
+    assert pyramid.preview_factor('axial') == 4
+    assert pyramid.preview_factor('sagital') == 2
+
+    # Con el lado mínimo por defecto (96) los mismos niveles dan planos más
+    # finos o ninguna vista previa
+    default = VolumePyramid(pyramid.volume)
+    default._build_levels()
+    assert default.levels.keys() == pyramid.levels.keys()
+    assert default.preview_factor('axial') == 2
+    assert default.preview_factor('sagital') is None
@@ -12,6 +12,8 @@ from PySide2.QtCore import *
 from PySide2.QtGui import *
 from PySide2.QtWidgets import *
 
+from HistogramWidget import HistogramWidget
+
 
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
@@ -22,6 +24,23 @@ class Ui_MainWindow(object):
         self.actionSalir.setObjectName(u"actionSalir")
         self.actionCarpeta = QAction(MainWindow)
         self.actionCarpeta.setObjectName(u"actionCarpeta")
+        self.actionCruz = QAction(MainWindow)
+        self.actionCruz.setObjectName(u"actionCruz")
+        self.actionCruz.setCheckable(True)
+        self.actionCruz.setChecked(True)
+        self.actionRendimiento = QAction(MainWindow)
+        self.actionRendimiento.setObjectName(u"actionRendimiento")
+        self.actionRendimiento.setCheckable(True)
+        self.actionExportarTraza = QAction(MainWindow)
+        self.actionExportarTraza.setObjectName(u"actionExportarTraza")
+        self.actionIsotropico = QAction(MainWindow)
+        self.actionIsotropico.setObjectName(u"actionIsotropico")
+        self.actionIsotropico.setCheckable(True)
+        self.actionIsotropico.setEnabled(False)
+        self.actionReducirRuido = QAction(MainWindow)
+        self.actionReducirRuido.setObjectName(u"actionReducirRuido")
+        self.actionReducirRuido.setCheckable(True)
+        self.actionReducirRuido.setEnabled(False)
         self.centralwidget = QWidget(MainWindow)
         self.centralwidget.setObjectName(u"centralwidget")
         self.gridLayout_3 = QGridLayout(self.centralwidget)
@@ -83,9 +102,75 @@ class Ui_MainWindow(object):
 
         self.formLayout.setWidget(2, QFormLayout.FieldRole, self.maxDoubleSpinBox)
 
+        self.label_11 = QLabel(self.groupBox)
+        self.label_11.setObjectName(u"label_11")
+
+        self.formLayout.setWidget(3, QFormLayout.LabelRole, self.label_11)
+
+        self.presetComboBox = QComboBox(self.groupBox)
+        self.presetComboBox.setObjectName(u"presetComboBox")
+        self.presetComboBox.setEnabled(False)
+
+        self.formLayout.setWidget(3, QFormLayout.FieldRole, self.presetComboBox)
+
+        self.histogramWidget = HistogramWidget(self.groupBox)
+        self.histogramWidget.setObjectName(u"histogramWidget")
+        self.histogramWidget.setMinimumSize(QSize(0, 80))
+
+        self.formLayout.setWidget(4, QFormLayout.SpanningRole, self.histogramWidget)
+
 
         self.gridLayout_2.addWidget(self.groupBox, 4, 3, 3, 3)
 
+        self.groupBox_2 = QGroupBox(self.centralwidget)
+        self.groupBox_2.setObjectName(u"groupBox_2")
+        self.formLayout_2 = QFormLayout(self.groupBox_2)
+        self.formLayout_2.setObjectName(u"formLayout_2")
+        self.label_12 = QLabel(self.groupBox_2)
+        self.label_12.setObjectName(u"label_12")
+
+        self.formLayout_2.setWidget(0, QFormLayout.LabelRole, self.label_12)
+
+        self.slabModeComboBox = QComboBox(self.groupBox_2)
+        self.slabModeComboBox.addItem("")
+        self.slabModeComboBox.addItem("")
+        self.slabModeComboBox.addItem("")
+        self.slabModeComboBox.addItem("")
+        self.slabModeComboBox.setObjectName(u"slabModeComboBox")
+        self.slabModeComboBox.setEnabled(False)
+
+        self.formLayout_2.setWidget(0, QFormLayout.FieldRole, self.slabModeComboBox)
+
+        self.label_13 = QLabel(self.groupBox_2)
+        self.label_13.setObjectName(u"label_13")
+
+        self.formLayout_2.setWidget(1, QFormLayout.LabelRole, self.label_13)
+
+        self.slabDoubleSpinBox = QDoubleSpinBox(self.groupBox_2)
+        self.slabDoubleSpinBox.setObjectName(u"slabDoubleSpinBox")
+        self.slabDoubleSpinBox.setEnabled(False)
+        self.slabDoubleSpinBox.setDecimals(1)
+        self.slabDoubleSpinBox.setMinimum(0.100000000000000)
+        self.slabDoubleSpinBox.setMaximum(500.000000000000000)
+        self.slabDoubleSpinBox.setValue(10.000000000000000)
+
+        self.formLayout_2.setWidget(1, QFormLayout.FieldRole, self.slabDoubleSpinBox)
+
+
+        self.gridLayout_2.addWidget(self.groupBox_2, 4, 0, 1, 3)
+
+        self.groupBox_3 = QGroupBox(self.centralwidget)
+        self.groupBox_3.setObjectName(u"groupBox_3")
+        self.verticalLayout = QVBoxLayout(self.groupBox_3)
+        self.verticalLayout.setObjectName(u"verticalLayout")
+        self.seriesListWidget = QListWidget(self.groupBox_3)
+        self.seriesListWidget.setObjectName(u"seriesListWidget")
+
+        self.verticalLayout.addWidget(self.seriesListWidget)
+
+
+        self.gridLayout_2.addWidget(self.groupBox_3, 4, 6, 3, 3)
+
         self.sagitalSpinBox = QSpinBox(self.centralwidget)
         self.sagitalSpinBox.setObjectName(u"sagitalSpinBox")
         self.sagitalSpinBox.setEnabled(False)
@@ -185,16 +270,28 @@ class Ui_MainWindow(object):
         self.menuArchivo.setObjectName(u"menuArchivo")
         self.menuAbrir = QMenu(self.menuArchivo)
         self.menuAbrir.setObjectName(u"menuAbrir")
+        self.menuVer = QMenu(self.menubar)
+        self.menuVer.setObjectName(u"menuVer")
+        self.menuVolumen = QMenu(self.menubar)
+        self.menuVolumen.setObjectName(u"menuVolumen")
         MainWindow.setMenuBar(self.menubar)
         self.statusbar = QStatusBar(MainWindow)
         self.statusbar.setObjectName(u"statusbar")
         MainWindow.setStatusBar(self.statusbar)
 
         self.menubar.addAction(self.menuArchivo.menuAction())
+        self.menubar.addAction(self.menuVer.menuAction())
+        self.menubar.addAction(self.menuVolumen.menuAction())
         self.menuArchivo.addAction(self.menuAbrir.menuAction())
         self.menuArchivo.addSeparator()
         self.menuArchivo.addAction(self.actionSalir)
         self.menuAbrir.addAction(self.actionCarpeta)
+        self.menuVer.addAction(self.actionCruz)
+        self.menuVer.addSeparator()
+        self.menuVer.addAction(self.actionRendimiento)
+        self.menuVer.addAction(self.actionExportarTraza)
+        self.menuVolumen.addAction(self.actionIsotropico)
+        self.menuVolumen.addAction(self.actionReducirRuido)
 
         self.retranslateUi(MainWindow)
 
@@ -211,6 +308,14 @@ class Ui_MainWindow(object):
 #if QT_CONFIG(shortcut)
         self.actionCarpeta.setShortcut(QCoreApplication.translate("MainWindow", u"Ctrl+O", None))
 #endif // QT_CONFIG(shortcut)
+        self.actionCruz.setText(QCoreApplication.translate("MainWindow", u"Cruz de referencia", None))
+        self.actionRendimiento.setText(QCoreApplication.translate("MainWindow", u"Rendimiento", None))
+#if QT_CONFIG(shortcut)
+        self.actionRendimiento.setShortcut(QCoreApplication.translate("MainWindow", u"F12", None))
+#endif // QT_CONFIG(shortcut)
+        self.actionExportarTraza.setText(QCoreApplication.translate("MainWindow", u"Exportar traza...", None))
+        self.actionIsotropico.setText(QCoreApplication.translate("MainWindow", u"V\u00f3xeles isotr\u00f3picos", None))
+        self.actionReducirRuido.setText(QCoreApplication.translate("MainWindow", u"Reducir ruido", None))
         self.groupBox.setTitle(QCoreApplication.translate("MainWindow", u"Controlador espectral", None))
         self.label_7.setText(QCoreApplication.translate("MainWindow", u"Rango espectral:", None))
         self.minLineEdit.setPlaceholderText(QCoreApplication.translate("MainWindow", u"-", None))
@@ -218,6 +323,17 @@ class Ui_MainWindow(object):
         self.maxLineEdit.setPlaceholderText(QCoreApplication.translate("MainWindow", u"-", None))
         self.label_4.setText(QCoreApplication.translate("MainWindow", u"L\u00edmite inferior:", None))
         self.label_5.setText(QCoreApplication.translate("MainWindow", u"L\u00edmite superior:", None))
+        self.label_11.setText(QCoreApplication.translate("MainWindow", u"Preajuste:", None))
+        self.groupBox_2.setTitle(QCoreApplication.translate("MainWindow", u"Proyecci\u00f3n", None))
+        self.label_12.setText(QCoreApplication.translate("MainWindow", u"Modo:", None))
+        self.slabModeComboBox.setItemText(0, QCoreApplication.translate("MainWindow", u"Corte", None))
+        self.slabModeComboBox.setItemText(1, QCoreApplication.translate("MainWindow", u"MIP", None))
+        self.slabModeComboBox.setItemText(2, QCoreApplication.translate("MainWindow", u"MinIP", None))
+        self.slabModeComboBox.setItemText(3, QCoreApplication.translate("MainWindow", u"Promedio", None))
+
+        self.label_13.setText(QCoreApplication.translate("MainWindow", u"Grosor:", None))
+        self.slabDoubleSpinBox.setSuffix(QCoreApplication.translate("MainWindow", u" mm", None))
+        self.groupBox_3.setTitle(QCoreApplication.translate("MainWindow", u"Series", None))
         self.label_3.setText(QCoreApplication.translate("MainWindow", u"Plano coronal", None))
         self.label.setText(QCoreApplication.translate("MainWindow", u"Plano axial", None))
         self.label_10.setText(QCoreApplication.translate("MainWindow", u"Corte", None))
@@ -226,5 +342,7 @@ class Ui_MainWindow(object):
         self.label_8.setText(QCoreApplication.translate("MainWindow", u"Corte", None))
         self.menuArchivo.setTitle(QCoreApplication.translate("MainWindow", u"Archivo", None))
         self.menuAbrir.setTitle(QCoreApplication.translate("MainWindow", u"Abrir", None))
+        self.menuVer.setTitle(QCoreApplication.translate("MainWindow", u"Ver", None))
+        self.menuVolumen.setTitle(QCoreApplication.translate("MainWindow", u"Volumen", None))
     # retranslateUi
 